@@ -0,0 +1,184 @@
+# ai.py
+
+import copy
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from engine import ROLL, PLACE, MOVE
+from search import ExpectimaxAI
+from probability import threat_probability
+
+# Features of a token move that evaluate_token_moves can weigh
+FEATURES = ["capture", "warp", "steps", "danger", "escape", "entry_distance", "loop", "ready"]
+DEFAULT_WEIGHTS = {"capture": 10, "warp": 5, "steps": 1,
+                   "danger": 0, "escape": 0, "entry_distance": 0, "loop": 0, "ready": 0}
+
+
+def token_move_features(state, token, steps):
+    """Feature values of moving a board token by steps"""
+    board = state.board
+    player_id = token.player_id
+    new_pos = board.destinations[token.position][steps]
+    is_warp = board.tiles[new_pos].is_warp
+    end_pos = board.get_next_warp(new_pos) if is_warp else new_pos
+    total = board.total_outer_tiles
+    return {
+        # Enemy tokens captured on the landing tile
+        "capture": 0 if new_pos in board.safe_tiles else len(state.enemies_at(player_id, new_pos)),
+        "warp": int(is_warp),
+        "steps": steps,
+        # Chance of being captured next roll where the token ends up, and where it is now
+        "danger": threat_probability(state, player_id, end_pos),
+        "escape": threat_probability(state, player_id, token.position),
+        # Share of the loop left before the token is back at its start and entry path
+        "entry_distance": (board.player_start_tiles[player_id] - end_pos) % total / total,
+        "loop": int(board.check_loop_completion(player_id, token, token.position, new_pos)),
+        "ready": int(token.ready_for_straight),
+    }
+
+
+def evaluate_token_moves(current_player, board, players, steps, state=None, weights=None):
+    """Best token to move by steps. The built-in scores are used unless weights
+    (a value per name in FEATURES) are given, which also needs the state."""
+    if weights is not None:
+        tokens = [t for t in current_player.tokens if not t.in_home]
+        if not tokens:
+            return None
+        return max(tokens, key=lambda t: sum(weights[name] * value
+                                             for name, value in token_move_features(state, t, steps).items()))
+
+    best_token = None
+    best_score = -float('inf')
+
+    for token in current_player.tokens:
+        if token.in_home or token.position is None:
+            continue
+
+        new_pos = board.destinations[token.position][steps]
+        score = 0
+
+        # Score for capturing
+        if new_pos not in board.safe_tiles:  # not a safe zone
+            if state is not None:
+                score += 10 * len(state.enemies_at(current_player.id, new_pos))
+            else:
+                for other in players:
+                    if other.id == current_player.id:
+                        continue
+                    for t in other.tokens:
+                        if t.position == new_pos and not t.in_home:
+                            score += 10
+
+        # Score for warp zone
+        if board.tiles[new_pos].is_warp:
+            score += 5
+
+        # Add steps as minor progress
+        score += steps
+
+        if score > best_score:
+            best_score = score
+            best_token = token
+
+    return best_token
+
+
+def greedy_policy(state, weights=None):
+    """Built-in AI: capture if possible, else place a token on a six, else best move.
+
+    weights switches the move choice to evaluate_token_moves with those weights;
+    bind them with functools.partial to get a policy.
+    """
+    if not state.rolled:
+        return (ROLL,)
+
+    player = state.current_player
+    board = state.board
+    steps = state.remaining_steps
+
+    # Step 1: Check all tokens for capture opportunities within remaining steps
+    if not state.capture_occurred_this_turn and state.placed_token is None:
+        for token in player.tokens:
+            if token.in_home:
+                continue
+            step = state.nearest_capture(player.id, token.position, steps)
+            if step is not None:
+                return (MOVE, token.token_id, step)
+
+    # Step 2: No capture, place new token if 6 rolled
+    if not state.capture_occurred_this_turn and state.can_place():
+        for token in player.tokens:
+            if token.in_home:
+                return (PLACE, token.token_id)
+
+    # Step 3: Move placed token (or best token) with remaining steps
+    token = state.placed_token or evaluate_token_moves(player, board, state.players, steps, state, weights)
+    return (MOVE, token.token_id, steps)
+
+
+def random_policy(state):
+    """Baseline AI that picks uniformly among the legal actions"""
+    return random.choice(state.legal_actions())
+
+
+POLICIES = {
+    "greedy": greedy_policy,
+    "random": random_policy,
+    # Depth limited rather than timed so tournament results stay reproducible
+    "expectimax": ExpectimaxAI(max_depth=1),
+}
+
+
+class BackgroundAI:
+    """Runs a policy on a worker thread so the caller can keep drawing frames.
+
+    think(state) starts a decision on a copy of the state and its board, and
+    poll() returns None until it is ready. Policies with a time budget, like
+    ExpectimaxAI, get one inside max_think_ms. If a decision still takes
+    longer, poll() gives the fallback policy's action instead; the late
+    worker is left to finish on its own and later decisions get a new one.
+    """
+
+    # Share of the cap a policy's budget may use, leaving time to hand the move back
+    BUDGET_SHARE = 0.8
+
+    def __init__(self, policy, max_think_ms=2000, fallback=greedy_policy):
+        if hasattr(policy, "budget_ms"):
+            # A copy, so the caller's policy keeps its own budget
+            policy = copy.copy(policy)
+            policy.budget_ms = min(policy.budget_ms or max_think_ms, max_think_ms * self.BUDGET_SHARE)
+        self.policy = policy
+        self.max_think_ms = max_think_ms
+        self.fallback = fallback
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.state = None
+        self.started = 0.0
+        self.timeouts = 0
+
+    def think(self, state):
+        self.state = state
+        self.started = time.perf_counter()
+        # The caller's board changes when warps refresh, so the worker reads its own
+        self.future = self.executor.submit(self.policy, state.copy(state.board.copy()))
+
+    def poll(self):
+        """The chosen action once there is one, else None"""
+        if self.future.done():
+            return self.future.result()
+        if (time.perf_counter() - self.started) * 1000 >= self.max_think_ms:
+            self.timeouts += 1
+            # A running future can't be cancelled: leave its thread to finish
+            # and think on a new one, with a policy object of its own
+            self.executor.shutdown(wait=False)
+            self.executor = ThreadPoolExecutor(max_workers=1)
+            self.policy = copy.copy(self.policy)
+            table = getattr(self.policy, "table", None)
+            if table is not None:
+                # Both threads would write the shared cache, so start an empty one
+                self.policy.table = type(table)(table.max_entries)
+            return self.fallback(self.state)
+        return None
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,197 @@
+# analytics.py
+
+import argparse
+import csv
+import mmap
+import os
+import random
+import time
+
+import numpy as np
+
+from board import Board
+from engine import seeded_game, EVENT_KINDS
+from record import read_games, start_state, replay_steps
+
+
+def recorded_events(data, board=None):
+    """Event stream of every game in a record; each game starts with ("game", seed, players)"""
+    board = board if board is not None else Board()
+    for game in read_games(data):
+        yield ("game", game.seed, len(game.ai_flags))
+        state = start_state(game, board)
+        for events in replay_steps(state, game):
+            yield from events
+
+
+def simulated_events(seats, seeds, max_turns=1000, board=None):
+    """Event stream of freshly played games, seeded like tournament.py"""
+    from ai import POLICIES  # ai imports the search, only needed here
+
+    policies = [POLICIES[name] for name in seats]
+    board = board if board is not None else Board()
+    for seed in seeds:
+        random.seed(seed)
+        state = seeded_game([True] * len(seats), seed, board)
+        yield ("game", seed, len(seats))
+        while not state.game_over and state.turns_played < max_turns:
+            yield from state.step(policies[state.current_player_index](state))
+
+
+class GameStats:
+    """Aggregates event streams into per-seat, per-tile and per-rule counters.
+
+    Only counters and the state of the current game are kept, so any number
+    of games can be fed through in constant memory.
+    """
+
+    def __init__(self, num_seats, num_tiles):
+        self.games = 0
+        self.rules = dict.fromkeys(EVENT_KINDS, 0)
+        seat_columns = ["games", "wins", "turns", "captures", "captured", "warps",
+                        "warp_captures", "extra_rolls", "loops", "first_loop_games", "first_loop_turns"]
+        self.seats = {name: [0] * num_seats for name in seat_columns}
+        tile_columns = ["landings", "captures", "warps_in", "warps_out"]
+        self.tiles = {name: [0] * num_tiles for name in tile_columns}
+        # chains[n]: turns with exactly n extra rolls for capturing
+        self.chains = [0]
+
+    def feed(self, events):
+        """Consume an event stream; returns self"""
+        seats = self.seats
+        tiles = self.tiles
+        rules = self.rules
+        turns = 0
+        chain = 0
+        mover = None
+        mover_warped = False
+        warped = set()  # Tokens that warped and haven't moved since
+        looped = set()
+
+        for event in events:
+            kind = event[0]
+            if kind == "game":
+                self.games += 1
+                for seat in range(event[2]):
+                    seats["games"][seat] += 1
+                turns = 0
+                chain = 0
+                warped.clear()
+                looped.clear()
+                continue
+
+            rules[kind] += 1
+            if kind == "move":
+                _, pid, token_id, _, to_tile = event
+                tiles["landings"][to_tile] += 1
+                mover = (pid, token_id)
+                mover_warped = mover in warped
+                warped.discard(mover)
+            elif kind == "capture":
+                _, pid, victim_id, victim_token_id, tile = event
+                seats["captures"][pid] += 1
+                seats["captured"][victim_id] += 1
+                tiles["captures"][tile] += 1
+                if mover_warped:
+                    seats["warp_captures"][pid] += 1
+                warped.discard((victim_id, victim_token_id))
+            elif kind == "warp":
+                _, pid, _, from_tile, to_tile = event
+                seats["warps"][pid] += 1
+                tiles["warps_in"][from_tile] += 1
+                tiles["warps_out"][to_tile] += 1
+                warped.add(mover)
+            elif kind == "loop":
+                pid = event[1]
+                seats["loops"][pid] += 1
+                if pid not in looped:
+                    looped.add(pid)
+                    seats["first_loop_games"][pid] += 1
+                    seats["first_loop_turns"][pid] += turns
+            elif kind == "extra_roll":
+                seats["extra_rolls"][event[1]] += 1
+                chain += 1
+            elif kind == "end_turn" or kind == "win":
+                self._end_chain(chain)
+                chain = 0
+                if kind == "win":
+                    seats["wins"][event[1]] += 1
+                else:
+                    turns += 1
+                    seats["turns"][event[1]] += 1
+        return self
+
+    def _end_chain(self, chain):
+        if chain >= len(self.chains):
+            self.chains.extend([0] * (chain + 1 - len(self.chains)))
+        self.chains[chain] += 1
+
+    def tables(self):
+        """Every metric as named tables of equal-length columns"""
+        num_seats = len(self.seats["games"])
+        return {
+            "seats": {"seat": list(range(1, num_seats + 1)), **self.seats},
+            "tiles": {"tile": list(range(len(self.tiles["landings"]))), **self.tiles},
+            "rules": {"event": list(self.rules), "count": list(self.rules.values())},
+            "chains": {"extra_rolls": list(range(len(self.chains))), "turns": list(self.chains)},
+        }
+
+
+def write_tables(tables, out_dir, fmt="csv"):
+    """Write each table as out_dir/<name>.csv, or as one column per array in <name>.npz"""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, columns in tables.items():
+        if fmt == "csv":
+            path = os.path.join(out_dir, name + ".csv")
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                writer.writerows(zip(*columns.values()))
+        else:
+            path = os.path.join(out_dir, name + ".npz")
+            np.savez_compressed(path, **{column: np.asarray(values) for column, values in columns.items()})
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate game statistics from recorded or simulated games")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--record", help="read games from this record file")
+    source.add_argument("--seats", nargs="+", help="simulate games with these policies")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--out", default="stats", help="directory for the exported tables")
+    parser.add_argument("--format", choices=["csv", "npz"], default="csv")
+    args = parser.parse_args()
+
+    board = Board()
+    start = time.perf_counter()
+    if args.record:
+        # Mapped rather than read, so huge records don't have to fit in memory
+        with open(args.record, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(args.record) else b""
+        num_seats = max((len(game.ai_flags) for game in read_games(data)), default=0)
+        events = recorded_events(data, board)
+    else:
+        num_seats = len(args.seats)
+        events = simulated_events(args.seats, range(args.seed, args.seed + args.games), args.max_turns, board)
+
+    stats = GameStats(num_seats, len(board.tiles)).feed(events)
+    elapsed = time.perf_counter() - start
+    paths = write_tables(stats.tables(), args.out, args.format)
+
+    seats = stats.seats
+    print(f"{stats.games} games in {elapsed:.2f}s, wrote {', '.join(paths)}")
+    for seat in range(num_seats):
+        warps = seats["warps"][seat]
+        first_loops = seats["first_loop_games"][seat]
+        print(f"Seat {seat + 1}: {seats['warp_captures'][seat] / max(warps, 1):.1%} of warps led to a capture, "
+              + (f"first loop after {seats['first_loop_turns'][seat] / first_loops:.1f} turns on average"
+                 if first_loops else "never completed a loop"))
+
+
+if __name__ == "__main__":
+    main()
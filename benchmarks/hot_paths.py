@@ -0,0 +1,144 @@
+# benchmarks/hot_paths.py
+#
+# Throughput and latency of the engine, AI and rendering hot paths, compared
+# against a saved baseline.
+# Run from the repository root: python -m benchmarks.hot_paths [--save]
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+from board import Board, build_layout
+from engine import seeded_game, play_game
+from ai import evaluate_token_moves, greedy_policy
+from renderer import TextCache
+from config import BOARD_WIDTH, BOARD_HEIGHT, BACKGROUND_COLOR
+from benchmarks.state_layout import mid_game_state
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+SAMPLE_SECONDS = 0.001  # Calls are timed in batches of about this long
+MIN_SAMPLES = 20
+
+
+def measure(func, seconds=0.5):
+    """Run func for about seconds; returns ops/s and p50/p99 latency in microseconds.
+
+    Fast calls are timed in batches, so their percentiles are of batch averages.
+    """
+    start = time.perf_counter()
+    func()
+    batch = max(1, int(SAMPLE_SECONDS / max(time.perf_counter() - start, 1e-9)))
+
+    samples = []
+    calls = 0
+    total = 0.0
+    while total < seconds or len(samples) < MIN_SAMPLES:
+        start = time.perf_counter()
+        for _ in range(batch):
+            func()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed / batch)
+        calls += batch
+        total += elapsed
+
+    samples.sort()
+    return {
+        "ops_per_second": calls / total,
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6,
+    }
+
+
+def hud_frame(screen, board, text_cache):
+    """Draw a full frame of the board with the HUD text the game shows"""
+    def frame():
+        screen.fill(BACKGROUND_COLOR)
+        board.draw(screen)
+        for player_id in range(5):
+            screen.blit(text_cache.render(f"Player {player_id + 1}: 0"), (40 + 180 * player_id, 760))
+        screen.blit(text_cache.render("Roll: 6 + 3", "large"), (20, 20))
+        for i in range(8):
+            screen.blit(text_cache.render(f"Player {i % 5 + 1} moved to {i * 5}"), (20, 60 + i * 20))
+        pygame.display.flip()
+    return frame
+
+
+def cases():
+    state = mid_game_state()
+    board = state.board
+    player = next(p for p in state.players if any(not t.in_home for t in p.tokens))
+    token = next(t for t in player.tokens if not t.in_home)
+    target = board.destinations[token.position][7]
+    seeds = itertools.count()
+    game_board = Board()
+
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((BOARD_WIDTH, BOARD_HEIGHT))
+
+    return [
+        ("Board()", Board),
+        ("build_layout 10x20 (uncached)", lambda: build_layout.__wrapped__(10, 20, 5)),
+        ("Player.get_valid_moves", lambda: player.get_valid_moves(board, 7)),
+        ("Board.is_valid_move", lambda: board.is_valid_move(player.id, token, target)),
+        ("Board.get_next_warp", lambda: board.get_next_warp(token.position)),
+        ("evaluate_token_moves", lambda: evaluate_token_moves(player, board, state.players, 7, state)),
+        ("headless game (4 greedy AIs)",
+         lambda: play_game(seeded_game([True] * 4, next(seeds), game_board), [greedy_policy] * 4, 1000)),
+        ("frame: Board.draw + HUD", hud_frame(screen, board, TextCache())),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot paths against a saved baseline")
+    parser.add_argument("--seconds", type=float, default=0.5, help="time spent on each benchmark")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fail when ops/s drops by more than this fraction of the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="save the results as the new baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    print(f"Python {sys.version.split()[0]} on {platform.machine()}")
+    print(f"{'Benchmark':<32}{'ops/s':>12}{'p50 us':>10}{'p99 us':>10}{'vs baseline':>13}")
+    results = {}
+    regressions = []
+    for name, func in cases():
+        result = measure(func, args.seconds)
+        results[name] = result
+        change = ""
+        if name in baseline:
+            ratio = result["ops_per_second"] / baseline[name]["ops_per_second"]
+            change = f"{ratio - 1:+.1%}"
+            if ratio < 1 - args.threshold:
+                regressions.append(name)
+                change += " !"
+        print(f"{name:<32}{result['ops_per_second']:>12.0f}{result['p50_us']:>10.2f}"
+              f"{result['p99_us']:>10.2f}{change:>13}")
+    pygame.quit()
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({"python": sys.version.split()[0], "machine": platform.machine(), "results": results},
+                      f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    if regressions:
+        print(f"Slower than the baseline by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/loadtest.py
+#
+# Many concurrent bot matches against one server process over loopback:
+# matches per second of server CPU and the latency of each move.
+# Run from the repository root: python -m benchmarks.loadtest
+
+import argparse
+import asyncio
+import os
+import time
+from multiprocessing import Pipe, Process, Pool
+
+from server import GameServer
+from client import play_bot
+from ai import POLICIES
+
+
+async def _serve(conn, seed, max_turns):
+    server = GameServer(seed, max_turns)
+    listener = await asyncio.start_server(server.handle_client, "127.0.0.1", 0)
+    conn.send(listener.sockets[0].getsockname()[1])
+    start = time.process_time()
+    async with listener:
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+    conn.send({"cpu_seconds": time.process_time() - start, "matches": server.matches_finished,
+               "actions": server.actions, "bytes_sent": server.bytes_sent})
+
+
+def run_server(conn, seed, max_turns):
+    asyncio.run(_serve(conn, seed, max_turns))
+
+
+async def _play(port, matches, players, concurrency, policy_name):
+    policy = POLICIES[policy_name]
+    latencies = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def match():
+        async with slots:
+            await asyncio.gather(*[play_bot("127.0.0.1", port, players, policy, latencies)
+                                   for _ in range(players)])
+
+    await asyncio.gather(*[match() for _ in range(matches)])
+    return latencies
+
+
+def run_bots(args):
+    return asyncio.run(_play(*args))
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the game server with loopback bots")
+    parser.add_argument("--matches", type=int, default=400)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=50, help="matches in flight per bot process")
+    parser.add_argument("--bot-processes", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--policy", default="greedy")
+    parser.add_argument("--max-turns", type=int, default=1000)
+    args = parser.parse_args()
+
+    conn, server_conn = Pipe()
+    server = Process(target=run_server, args=(server_conn, 0, args.max_turns))
+    server.start()
+    port = conn.recv()
+
+    shares = [args.matches // args.bot_processes + (i < args.matches % args.bot_processes)
+              for i in range(args.bot_processes)]
+    start = time.perf_counter()
+    with Pool(args.bot_processes) as pool:
+        results = pool.map(run_bots, [(port, share, args.players, args.concurrency, args.policy)
+                                      for share in shares if share])
+    elapsed = time.perf_counter() - start
+    conn.send("stop")
+    stats = conn.recv()
+    server.join()
+
+    latencies = sorted(latency for result in results for latency in result)
+    print(f"{stats['matches']} matches of {args.players} {args.policy} bots in {elapsed:.2f}s "
+          f"({stats['matches'] / elapsed:.1f} matches/s, {stats['actions'] / elapsed:.0f} actions/s)")
+    print(f"Server CPU {stats['cpu_seconds']:.2f}s: "
+          f"{stats['matches'] / max(stats['cpu_seconds'], 1e-9):.1f} matches per core-second")
+    print(f"Move latency over {len(latencies)} actions: p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms")
+    print(f"Broadcast {stats['bytes_sent'] / max(stats['actions'], 1):.1f} bytes per action "
+          f"to {args.players} seats")
+
+
+if __name__ == "__main__":
+    main()
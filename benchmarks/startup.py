@@ -0,0 +1,54 @@
+# benchmarks/startup.py
+#
+# Start-up cost of the headless rule layer, which must not load pygame,
+# against the pygame front end.
+# Run from the repository root: python -m benchmarks.startup
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Snippets timed in a fresh interpreter each; the headless ones also fail
+# if anything they import pulls pygame in
+CASES = [
+    ("python", "pass", True),
+    ("import engine", "import engine", True),
+    ("import ai, search", "import ai, search", True),
+    ("engine + seeded_game", "from engine import seeded_game; seeded_game([True] * 4, 0)", True),
+    ("import pygame", "import pygame", False),
+    ("import renderer", "import renderer", False),
+]
+
+CHECK = "\nimport sys\nassert 'pygame' not in sys.modules, 'pygame was imported'"
+
+
+def time_snippet(code, runs):
+    """Fastest wall time in milliseconds of running code in a new interpreter"""
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT="1", SDL_VIDEODRIVER="dummy")
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure interpreter start-up with and without pygame")
+    parser.add_argument("--runs", type=int, default=10, help="interpreters started per case, the fastest counts")
+    args = parser.parse_args()
+
+    print(f"{'Case':<24}{'ms':>10}{'over python':>14}")
+    base = None
+    for name, code, headless in CASES:
+        ms = time_snippet(code + CHECK if headless else code, args.runs)
+        base = ms if base is None else base
+        print(f"{name:<24}{ms:>10.1f}{ms - base:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
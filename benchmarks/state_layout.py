@@ -0,0 +1,103 @@
+# benchmarks/state_layout.py
+#
+# Memory and copy cost of a mid-game state in each representation.
+# Run from the repository root: python -m benchmarks.state_layout
+
+import copy
+import sys
+import timeit
+import tracemalloc
+
+from engine import seeded_game
+from ai import greedy_policy
+from player import Player, Token
+
+
+# The Token and Player layout before they got __slots__, for the comparison:
+# the same attributes, kept in a per-instance dict
+
+class DictToken:
+    def __init__(self, token):
+        for name in Token.__slots__:
+            setattr(self, name, getattr(token, name))
+
+
+class DictPlayer:
+    def __init__(self, player):
+        for name in Player.__slots__:
+            setattr(self, name, getattr(player, name))
+        self.tokens = [DictToken(token) for token in player.tokens]
+
+
+def dict_state_copy(state, players, occupants):
+    """GameState.copy() as it was then: copy.copy of every object, occupants listed per tile"""
+    clone = copy.copy(state)
+    clone.players = []
+    tokens = {}
+    for player in players:
+        new_player = copy.copy(player)
+        new_player.tokens = []
+        for token in player.tokens:
+            new_token = copy.copy(token)
+            new_player.tokens.append(new_token)
+            tokens[id(token)] = new_token
+        clone.players.append(new_player)
+    clone.dice = copy.copy(state.dice)
+    clone.occupants = [[tokens[id(t)] for t in tile] for tile in occupants]
+    clone.occupied_mask = dict(state.occupied_mask)
+    return clone
+
+
+def mid_game_state(num_players=4, seed=0, actions=60):
+    state = seeded_game([True] * num_players, seed)
+    for _ in range(actions):
+        if state.game_over:
+            break
+        state.step(greedy_policy(state))
+    return state
+
+
+def allocated_bytes(make, count=1000):
+    """Average bytes allocated per object returned by make()"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [make() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+
+def time_per_call(func, number=20000):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    state = mid_game_state()
+    snapshot = state.snapshot()
+
+    def undo():
+        state.restore(snapshot)
+
+    dict_players = [DictPlayer(player) for player in state.players]
+    dict_occupants = [[t for p in dict_players for t in p.tokens if not t.in_home and t.position == tile]
+                      for tile in range(len(state.board.tiles))]
+
+    rows = [
+        ("copy.deepcopy(players), dict", lambda: copy.deepcopy(dict_players)),
+        ("copy.deepcopy(players)", lambda: copy.deepcopy(state.players)),
+        ("GameState.copy(), dict", lambda: dict_state_copy(state, dict_players, dict_occupants)),
+        ("GameState.copy()", state.copy),
+        ("GameState.snapshot()", state.snapshot),
+        ("GameState.restore(snapshot)", undo),
+    ]
+
+    print(f"Python {sys.version.split()[0]}, {len(state.players)} players")
+    print(f"{'Representation':<30}{'us/call':>10}{'bytes':>10}")
+    for name, func in rows:
+        memory = allocated_bytes(func) if func is not undo else 0
+        print(f"{name:<30}{time_per_call(func):>10.2f}{memory:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,16 @@
-import pygame
+import copy
 import random
 import math
-from config import TILE_SIZE, PLAYER_COLORS
-from pygame.color import Color
+from collections import namedtuple
+from functools import lru_cache
+from config import TILE_SIZE, PLAYER_COLORS, DICE_PER_TURN
+
+# The rules never touch pygame; it is imported when a tile is first drawn,
+# so headless simulations don't pay for loading SDL.
 
 class Tile:
+    __slots__ = ("x", "y", "index", "is_warp", "is_path", "path_color", "has_trail", "trail_color", "_rect")
+
     def __init__(self, x, y, index):
         self.x = x
         self.y = y
@@ -14,9 +20,18 @@ class Tile:
         self.path_color = None
         self.has_trail = False
         self.trail_color = None
-        self.rect = pygame.Rect(x+4, y+4, TILE_SIZE-8, TILE_SIZE-8)
+        self._rect = None
+
+    @property
+    def rect(self):
+        """Screen rect of the tile, built on first use"""
+        if self._rect is None:
+            import pygame
+            self._rect = pygame.Rect(self.x+4, self.y+4, TILE_SIZE-8, TILE_SIZE-8)
+        return self._rect
 
     def draw(self, screen, goal_index=None):
+        import pygame
         # Draw trail first (if exists)
         if self.has_trail and self.trail_color:
             pygame.draw.rect(screen, self.trail_color, self.rect, border_radius=4)
@@ -35,8 +50,91 @@ class Tile:
         pygame.draw.rect(screen, (0, 0, 0), self.rect, 1)
 
 
+# Everything about a board that doesn't change during play. tiles holds
+# (x, y, path_owner) per tile, path_owner being the player whose straight
+# path runs over it or None; the outer loop comes first, then the center.
+BoardLayout = namedtuple("BoardLayout", ["tiles", "start_tiles", "base_positions", "entry_paths",
+                                         "center_index", "total_outer_tiles", "path_length"])
+
+# Snapshots, diffs and records store a tile as one byte, and byte 255
+# (engine.NONE_BYTE) means a token at home, so tiles are numbered 0..254
+MAX_TILES = 255
+
+
+@lru_cache(maxsize=32)
+def build_layout(sides=5, side_length=8, path_length=6, center=(400, 400), radius=250):
+    """Geometry of a board with one side, start tile and straight path per player.
+
+    Layouts are cached and are plain tuples, so building another Board of
+    the same shape is cheap and a layout can be pickled to worker processes.
+    """
+    center_x, center_y = center
+    tiles = []
+
+    corners = []
+    for i in range(sides):
+        angle_rad = math.radians(90 + i * 360 / sides)
+        corners.append((int(center_x + radius * math.cos(angle_rad)),
+                        int(center_y - radius * math.sin(angle_rad))))
+    for i in range(sides):
+        (x0, y0), (x1, y1) = corners[i], corners[(i + 1) % sides]
+        for j in range(side_length):
+            t = j / side_length
+            tiles.append([int((1 - t) * x0 + t * x1), int((1 - t) * y0 + t * y1), None])
+    total_outer = len(tiles)
+    start_tiles = {i: i * side_length for i in range(sides)}
+
+    base_offset = 2
+    base_positions = {i: tuple(tiles[start + base_offset][:2]) for i, start in start_tiles.items()}
+
+    center_index = len(tiles)
+    tiles.append([center_x, center_y, None])
+
+    # Tiles closer than 2 pixels on both axes are the same tile. They are
+    # bucketed by 2-pixel cells, so only the 3x3 cells around a point can hold one.
+    cells = {}
+    def add_to_cells(index):
+        x, y, _ = tiles[index]
+        cells.setdefault((x // 2, y // 2), []).append(index)
+    for index in range(len(tiles)):
+        add_to_cells(index)
+
+    def find_tile(x, y):
+        cx, cy = int(x // 2), int(y // 2)
+        found = [i for dx in (-1, 0, 1) for dy in (-1, 0, 1) for i in cells.get((cx + dx, cy + dy), ())
+                 if abs(tiles[i][0] - x) < 2 and abs(tiles[i][1] - y) < 2]
+        return min(found, default=None)
+
+    entry_paths = {}
+    for player_id, start_index in start_tiles.items():
+        start_x, start_y, _ = tiles[start_index]
+        dx = (center_x - start_x) / (path_length - 1)
+        dy = (center_y - start_y) / (path_length - 1)
+        path = [start_index]
+        for step in range(1, path_length):
+            x = start_x + dx * step
+            y = start_y + dy * step
+            index = find_tile(x, y)
+            if index is None:
+                index = len(tiles)
+                tiles.append([int(x), int(y), None])
+                add_to_cells(index)
+            path.append(index)
+        for index in path:
+            tiles[index][2] = player_id
+        entry_paths[player_id] = tuple(path)
+
+    if len(tiles) > MAX_TILES:
+        raise ValueError(f"A board of {len(tiles)} tiles is over the limit of {MAX_TILES}")
+    return BoardLayout(tuple(map(tuple, tiles)), start_tiles, base_positions, entry_paths,
+                       center_index, total_outer, path_length)
+
+
 class Board:
-    def __init__(self):
+    def __init__(self, rng=None, layout=None):
+        # Warp zones are placed with this random.Random, or the global random module
+        self.rng = rng if rng is not None else random
+        self.layout = layout if layout is not None else build_layout()
         self.tiles = []
         self.player_start_tiles = {}
         self.player_base_tiles = {}
@@ -45,146 +143,125 @@ class Board:
         self.warp_indices = []
         self.goal_tile_index = None
         self.player_trail_positions = {}
+        self.changed_tiles = set()  # Tiles that look different since take_changed_tiles
+        self.total_outer_tiles = self.layout.total_outer_tiles
+        self.straight_path_length = self.layout.path_length
+        self.next_warp = []
         self._initialize_board()
-        self.total_outer_tiles = 40
-        self.straight_path_length = 6
 
     def update_trail(self, player_id, position):
-        """Update the trail for a player moving along their straight path"""
-        # Clear previous trail for this player
-        if player_id in self.player_trail_positions:
-            for idx in self.player_trail_positions[player_id]:
-                if 0 <= idx < len(self.tiles):
-                    self.tiles[idx].has_trail = False
-            
-        # If position is in the player's straight path, set trail
-        if player_id in self.player_entry_tiles and position in self.player_entry_tiles[player_id]:
-            path_index = self.player_entry_tiles[player_id].index(position)
-            # Mark all tiles from start of path up to current position
-            trail_indices = self.player_entry_tiles[player_id][:path_index + 1]
-            self.player_trail_positions[player_id] = trail_indices
-            for idx in trail_indices:
-                if 0 <= idx < len(self.tiles):
-                    self.tiles[idx].has_trail = True
-                    self.tiles[idx].trail_color = list(PLAYER_COLORS.values())[player_id]
+        """Update the trail for a player moving along their straight path.
+
+        The trail covers the path from its start up to position, or nothing
+        when position is off the path. Old and new trails are both prefixes
+        of the path, so only the tiles between their ends change; those are
+        returned and added to changed_tiles.
+        """
+        path = self.player_entry_tiles.get(player_id, [])
+        old_length = len(self.player_trail_positions.get(player_id, ()))
+        new_length = self.path_positions.get(player_id, {}).get(position, -1) + 1
+        if new_length == old_length:
+            return []
+
+        self.player_trail_positions[player_id] = path[:new_length]
+        if new_length > old_length:
+            changed = path[old_length:new_length]
+            color = self.trail_colors[player_id]
+            for idx in changed:
+                self.tiles[idx].has_trail = True
+                self.tiles[idx].trail_color = color
         else:
-            self.player_trail_positions[player_id] = []
+            changed = path[new_length:old_length]
+            for idx in changed:
+                self.tiles[idx].has_trail = False
+        self.changed_tiles.update(changed)
+        return changed
+
+    def copy(self):
+        """Copy with its own tiles and warp zones, sharing the layout and move tables.
+
+        For reading the board on another thread while this one keeps changing.
+        """
+        clone = copy.copy(self)
+        clone.tiles = [copy.copy(tile) for tile in self.tiles]
+        clone.warp_indices = list(self.warp_indices)
+        clone.player_trail_positions = dict(self.player_trail_positions)
+        clone.changed_tiles = set()
+        return clone
+
+    def take_changed_tiles(self):
+        """Tiles whose warp or trail state changed since the last call"""
+        changed = self.changed_tiles
+        self.changed_tiles = set()
+        return changed
 
     def _initialize_board(self):
         """Initialize all board components"""
-        self._create_pentagon_path()
-        self._create_base_tiles()
-        self._create_center_tile()
-        self._create_entry_paths()
+        self._create_tiles()
+        self._create_move_tables()
         self.update_warp_zones()  # Initialize warp zones
 
-    def _create_pentagon_path(self):
-        """Create the outer pentagon path"""
-        center_x, center_y = 400, 400
-        radius_outer = 250
-        side_length = 8
-        index = 0
-
-        def get_point_on_pentagon(angle_deg, radius):
-            angle_rad = math.radians(angle_deg)
-            x = center_x + radius * math.cos(angle_rad)
-            y = center_y - radius * math.sin(angle_rad)
-            return int(x), int(y)
-
-        outer_corners = [get_point_on_pentagon(90 + i * 72, radius_outer) for i in range(5)]
-
-        for i in range(5):
-            start_point = outer_corners[i]
-            end_point = outer_corners[(i + 1) % 5]
-            for j in range(side_length):
-                t = j / side_length
-                x = int((1 - t) * start_point[0] + t * end_point[0])
-                y = int((1 - t) * start_point[1] + t * end_point[1])
-                self.tiles.append(Tile(x, y, index))
-                index += 1
-            self.player_start_tiles[i] = self.tiles[i * side_length].index
-
-    def _create_base_tiles(self):
-        """Create base tiles for each player"""
-        base_offset = 2
-        for i in range(5):
-            start_index = i * 8  # 8 tiles per side
-            base_x = self.tiles[start_index + base_offset].x
-            base_y = self.tiles[start_index + base_offset].y
-            self.player_base_tiles[i] = (base_x, base_y)
-
-    def _create_center_tile(self):
-        """Create the center goal tile"""
-        center_x, center_y = 400, 400
-        self.center_goal_index = len(self.tiles)
-        center_tile = Tile(center_x, center_y, self.center_goal_index)
-        self.tiles.append(center_tile)
-        self.goal_tile_index = self.center_goal_index
-
-    def _create_entry_paths(self):
-        """Create straight paths from each base to center"""
-        center_x, center_y = 400, 400
-        path_length = 6  # Number of tiles in the straight path
+    def _create_tiles(self):
+        """Create the tiles and paths of the layout"""
+        layout = self.layout
         player_colors = list(PLAYER_COLORS.values())
-        
-        for player_id in range(5):
-            # Get the actual starting tile (corner of pentagon)
-            start_index = self.player_start_tiles[player_id]
-            start_tile = self.tiles[start_index]
-            start_x, start_y = start_tile.x, start_tile.y
-            
-            # Create lighter version of player color
-            original_color = Color(player_colors[player_id])
-            light_color = Color(
-                min(255, original_color.r + 150),
-                min(255, original_color.g + 150),
-                min(255, original_color.b + 150)
-            )
-            
-            # Calculate direction vector from start to center
-            dx = (center_x - start_x) / (path_length - 1)
-            dy = (center_y - start_y) / (path_length - 1)
-            
-            entry_path = []
-            
-            # Create path tiles starting from the corner tile
-            for step in range(path_length):
-                x = start_x + dx * step
-                y = start_y + dy * step
-                
-                # For the first tile (step 0), mark the existing corner tile
-                if step == 0:
-                    start_tile.is_path = True
-                    start_tile.path_color = light_color
-                    entry_path.append(start_index)
-                else:
-                    # For other path tiles
-                    existing_tile = next((t for t in self.tiles 
-                                        if abs(t.x - x) < 2 and abs(t.y - y) < 2), None)
-                    if existing_tile:
-                        existing_tile.is_path = True
-                        existing_tile.path_color = light_color
-                        entry_path.append(existing_tile.index)
+        # Lighter versions of the player colors for their straight paths
+        path_colors = [tuple(min(255, c + 150) for c in color) for color in player_colors]
+
+        for index, (x, y, path_owner) in enumerate(layout.tiles):
+            tile = Tile(x, y, index)
+            if path_owner is not None:
+                tile.is_path = True
+                tile.path_color = path_colors[path_owner % len(path_colors)]
+            self.tiles.append(tile)
+
+        self.player_start_tiles = dict(layout.start_tiles)
+        self.player_base_tiles = dict(layout.base_positions)
+        self.player_entry_tiles = {pid: list(path) for pid, path in layout.entry_paths.items()}
+        # path_positions[pid][tile]: how far along the player's straight path the tile is
+        self.path_positions = {pid: {idx: i for i, idx in enumerate(path)}
+                               for pid, path in layout.entry_paths.items()}
+        self.trail_colors = {pid: player_colors[pid % len(player_colors)] for pid in layout.entry_paths}
+        self.center_goal_index = layout.center_index
+        self.goal_tile_index = layout.center_index
+
+    def _create_move_tables(self):
+        """Precompute lookups used on every move so rule checks are plain indexing"""
+        total = self.total_outer_tiles
+        max_roll = DICE_PER_TURN * 6
+
+        # destinations[pos][steps] -> tile reached moving steps along the outer path
+        self.destinations = [[(pos + steps) % total for steps in range(max_roll + 1)]
+                             for pos in range(total)]
+
+        # Start tiles are safe zones: no captures there
+        self.safe_tiles = frozenset(self.player_start_tiles.values())
+
+        # Per player masks over all tiles: own straight path, other players' paths
+        self.own_path_tiles = {}
+        self.forbidden_tiles = {}
+        for player_id in self.player_entry_tiles:
+            own = [False] * len(self.tiles)
+            forbidden = [False] * len(self.tiles)
+            for pid, path in self.player_entry_tiles.items():
+                for idx in path:
+                    if pid == player_id:
+                        own[idx] = True
                     else:
-                        new_index = len(self.tiles)
-                        path_tile = Tile(int(x), int(y), new_index)
-                        path_tile.is_path = True
-                        path_tile.path_color = light_color
-                        self.tiles.append(path_tile)
-                        entry_path.append(new_index)
-            
-            self.player_entry_tiles[player_id] = entry_path
+                        forbidden[idx] = True
+            self.own_path_tiles[player_id] = own
+            self.forbidden_tiles[player_id] = forbidden
 
     def is_valid_move(self, player_id, token, new_position):
         """Check if move follows all the new rules"""
         wrapped_pos = new_position % self.total_outer_tiles
         # Can't move to other players' straight paths
-        for pid, path in self.player_entry_tiles.items():
-            if pid != player_id and new_position in path:
-                return False
+        forbidden = self.forbidden_tiles[player_id]
+        if 0 <= new_position < len(forbidden) and forbidden[new_position]:
+            return False
         
         # Can only enter own straight path after 1 loop and 1 capture
-        if wrapped_pos in self.player_entry_tiles.get(player_id, []):
+        if self.own_path_tiles[player_id][wrapped_pos]:
             if not (token.loops_completed >= 1 and token.captures >= 1):
                 return False
         
@@ -233,22 +310,33 @@ class Board:
 
     def update_warp_zones(self):
         """Update warp zone locations"""
-        for tile in self.tiles:
-            tile.is_warp = False
-
         possible_indices = [
             i for i, tile in enumerate(self.tiles)
             if tile.index != self.center_goal_index and not tile.is_path
         ]
         
         if len(possible_indices) >= 4:
-            self.warp_indices = random.sample(possible_indices, 4)
-            for idx in self.warp_indices:
-                self.tiles[idx].is_warp = True
+            self.set_warp_zones(self.rng.sample(possible_indices, 4))
 
-    def get_next_warp(self, current_index):
+    def set_warp_zones(self, warp_indices):
+        """Put the warp zones on the given tiles"""
+        old = set(self.warp_indices)
+        self.warp_indices = list(warp_indices)
+        new = set(self.warp_indices)
+        for idx in old - new:
+            self.tiles[idx].is_warp = False
+        for idx in new - old:
+            self.tiles[idx].is_warp = True
+        self.changed_tiles |= old ^ new
+
+        # next_warp[i] -> first warp after tile i, wrapping around to the lowest.
+        # A new tuple each time, so a reader never sees a half-built table.
         warp_list = sorted(self.warp_indices)
-        for warp in warp_list:
-            if warp > current_index:
-                return warp
-        return warp_list[0]  # wrap around
+        next_warp = []
+        for i in range(len(self.tiles)):
+            later = [warp for warp in warp_list if warp > i]
+            next_warp.append(later[0] if later else warp_list[0])
+        self.next_warp = tuple(next_warp)
+
+    def get_next_warp(self, current_index):
+        return self.next_warp[current_index]
@@ -0,0 +1,42 @@
+# clicks.py
+
+from config import TILE_SIZE
+
+
+class ClickIndex:
+    """Resolves a mouse position to the clickable things under it.
+
+    Targets are registered once with a key and a rect (x, y, width, height)
+    and bucketed on a grid of cell_size cells, so a lookup only checks the
+    few targets sharing the clicked cell.
+    """
+
+    def __init__(self, cell_size=TILE_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def add(self, key, rect):
+        x, y, w, h = rect
+        size = self.cell_size
+        for cx in range(x // size, (x + w - 1) // size + 1):
+            for cy in range(y // size, (y + h - 1) // size + 1):
+                self.cells.setdefault((cx, cy), []).append((key, rect))
+
+    def at(self, pos):
+        """Keys of every target containing pos, in the order they were added"""
+        px, py = pos
+        return [key for key, (x, y, w, h) in self.cells.get((px // self.cell_size, py // self.cell_size), ())
+                if x <= px < x + w and y <= py < y + h]
+
+
+def build_click_index(board, home_slots):
+    """Index of every board tile, keyed ("tile", index), and every home slot,
+    keyed ("home", player_id, slot); home_slots maps player_id to slot centers"""
+    index = ClickIndex()
+    for tile in board.tiles:
+        index.add(("tile", tile.index), (tile.x, tile.y, TILE_SIZE, TILE_SIZE))
+    for player_id, slots in home_slots.items():
+        for slot, (x, y) in enumerate(slots):
+            index.add(("home", player_id, slot),
+                      (x - TILE_SIZE // 5, y - TILE_SIZE // 5, TILE_SIZE // 2, TILE_SIZE // 2))
+    return index
@@ -0,0 +1,225 @@
+# client.py
+
+import argparse
+import asyncio
+import queue
+import threading
+import time
+
+import protocol
+from ai import POLICIES
+from record import RecordedGame, start_state, describe_state
+
+
+class MatchClient:
+    """A seat in an online match, or a spectator, with a copy of the game state.
+
+    The copy is kept up to date with the server's KEYFRAME and DIFF
+    messages, so policies and the UI can read it like a local game.
+    """
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.match_id = None
+        self.seat = None  # None for spectators
+        self.key = None   # Proves the seat is ours to RESUME after a lost connection
+        self.state = None
+        self.winner = None
+        self.finished = False
+
+    @classmethod
+    async def connect(cls, host, port, num_players):
+        """Join a match and wait until it starts"""
+        return await cls.open(host, port, protocol.hello(num_players))
+
+    @classmethod
+    async def resume(cls, host, port, match_id, seat, key):
+        """Take a seat back after losing the connection, caught up with the match"""
+        return await cls.open(host, port, protocol.resume(match_id, seat, key))
+
+    @classmethod
+    async def watch(cls, host, port, match_id):
+        """Follow a running match as a spectator"""
+        return await cls.open(host, port, protocol.watch(match_id))
+
+    @classmethod
+    async def open(cls, host, port, first_message):
+        reader, writer = await asyncio.open_connection(host, port)
+        client = cls(reader, writer)
+        writer.write(first_message)
+        kind, payload = await protocol.read_message(reader)
+        if kind == protocol.ERROR:
+            writer.close()
+            raise ValueError(payload.decode())
+        if kind != protocol.WELCOME:
+            raise ConnectionError(f"Expected WELCOME, got message type {kind}")
+        client.match_id, seat, client.key, catch_up, ai_flags, warps = protocol.parse_welcome(payload)
+        client.seat = None if seat == protocol.NONE_BYTE else seat
+        client.state = start_state(RecordedGame(0, ai_flags, warps, b""))
+        # The last keyframe and the diffs since bring the copy up to date
+        for _ in range(catch_up + 1):
+            await client.receive()
+        return client
+
+    @property
+    def my_turn(self):
+        state = self.state
+        return not self.finished and not state.game_over and state.current_player_index == self.seat
+
+    def send(self, action):
+        self.writer.write(protocol.action_message(action))
+
+    async def receive(self):
+        """Read and handle the next message; returns its type"""
+        kind, payload = await protocol.read_message(self.reader)
+        self.handle(kind, payload)
+        return kind
+
+    def handle(self, kind, payload):
+        """Apply a message from the server; returns the events of a DIFF"""
+        if kind == protocol.DIFF:
+            return self.state.apply_diff(payload)
+        if kind == protocol.KEYFRAME:
+            self.state.load_keyframe(payload)
+        elif kind == protocol.END:
+            self.finished = True
+            self.winner = None if payload[0] == protocol.NONE_BYTE else payload[0]
+        elif kind == protocol.ERROR:
+            raise ValueError(payload.decode())
+        return []
+
+    def close(self):
+        self.writer.close()
+
+
+async def play_bot(host, port, num_players, policy, latencies=None):
+    """Play a whole match with a policy; returns the client once the match has ended.
+
+    With latencies, the seconds from sending each action to seeing it
+    applied are appended to it.
+    """
+    client = await MatchClient.connect(host, port, num_players)
+    try:
+        while not client.finished:
+            if client.my_turn:
+                sent = time.perf_counter()
+                client.send(policy(client.state))
+                while await client.receive() != protocol.DIFF:
+                    pass
+                if latencies is not None:
+                    latencies.append(time.perf_counter() - sent)
+            else:
+                await client.receive()
+    finally:
+        client.close()
+    return client
+
+
+async def spectate(host, port, match_id, log=print):
+    """Follow a match to its end, logging every event; returns the client"""
+    client = await MatchClient.watch(host, port, match_id)
+    log(describe_state(client.state))
+    try:
+        while not client.finished:
+            for event in client.handle(*await protocol.read_message(client.reader)):
+                log(" ".join(map(str, event)))
+    finally:
+        client.close()
+    log(describe_state(client.state))
+    return client
+
+
+class ThreadedClient:
+    """A MatchClient whose connection lives on a background event loop.
+
+    For the pygame UI, which never waits on the network: the connection
+    opens in the background, actions are sent without waiting for the
+    reply, and messages are queued as they arrive. on_message is called
+    from the network thread once the match starts and for every message,
+    to wake the UI up. The UI applies them with poll(), so only its own
+    thread changes the state.
+    """
+
+    def __init__(self, host, port, num_players, on_message=None):
+        self.on_message = on_message or (lambda: None)
+        self.incoming = queue.Queue()
+        self.client = None    # Set once the match has started
+        self.failed = None    # Why joining failed, if it did
+        self.pending = False  # An action was sent and its reply hasn't been polled yet
+        self.errors = []      # Why the server refused actions, for the UI to show
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.running = asyncio.run_coroutine_threadsafe(self._run(host, port, num_players), self.loop)
+
+    async def _run(self, host, port, num_players):
+        try:
+            self.client = await MatchClient.connect(host, port, num_players)
+        except (OSError, EOFError, ValueError) as e:
+            self.failed = str(e) or type(e).__name__
+            self.on_message()
+            return
+        self.on_message()
+        try:
+            while True:
+                message = await protocol.read_message(self.client.reader)
+                self.incoming.put(message)
+                self.on_message()
+                if message[0] == protocol.END:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # A lost connection ends the match like the server would
+            self.incoming.put((protocol.END, bytes([protocol.NONE_BYTE])))
+            self.on_message()
+
+    def poll(self):
+        """Apply every message received so far; returns their events.
+
+        The reasons of refused actions go to errors.
+        """
+        events = []
+        while not self.incoming.empty():
+            kind, payload = self.incoming.get()
+            if kind in (protocol.DIFF, protocol.END, protocol.ERROR):
+                self.pending = False
+            if kind == protocol.ERROR:
+                self.errors.append(payload.decode())
+            else:
+                events += self.client.handle(kind, payload)
+        return events
+
+    def send(self, action):
+        """Send an action without waiting; poll() applies the reply once it arrives"""
+        self.pending = True
+        self.loop.call_soon_threadsafe(self.client.send, action)
+
+    def close(self):
+        self.running.cancel()
+        if self.client:
+            self.loop.call_soon_threadsafe(self.client.close)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play online matches with an AI policy")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--players", type=int, default=2, help="players in each match")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--matches", type=int, default=1)
+    parser.add_argument("--watch", type=int, metavar="MATCH_ID", help="follow a running match instead")
+    args = parser.parse_args()
+
+    if args.watch is not None:
+        asyncio.run(spectate(args.host, args.port, args.watch))
+        return
+
+    for _ in range(args.matches):
+        latencies = []
+        client = asyncio.run(play_bot(args.host, args.port, args.players, POLICIES[args.policy], latencies))
+        result = "nobody won" if client.winner is None else f"seat {client.winner + 1} won"
+        print(f"Match {client.match_id} in seat {client.seat + 1}: {result}, "
+              f"{len(latencies)} actions, {sum(latencies) / max(len(latencies), 1) * 1000:.2f} ms average")
+
+
+if __name__ == "__main__":
+    main()
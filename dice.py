@@ -2,13 +2,40 @@
 
 import random
 
+FACES = range(1, 7)
+
 class Dice:
-    def __init__(self):
+    def __init__(self, rng=None):
         self.values = (0, 0)
+        # Any random.Random; the global random module by default
+        self.rng = rng if rng is not None else random
 
     def roll(self):
-        self.values = (random.randint(1, 6), random.randint(1, 6))
+        self.values = (self.rng.randint(1, 6), self.rng.randint(1, 6))
         return self.values
 
     def total(self):
         return sum(self.values)
+
+
+class BufferedDice(Dice):
+    """Dice that draw their faces from the rng in batches, for fast simulation.
+
+    Rolls are as random as Dice's, but come from a different sequence for
+    the same seed.
+    """
+
+    def __init__(self, rng=None, batch_size=1024):
+        super().__init__(rng)
+        self.batch_size = batch_size
+        self.faces = []
+        self.next_face = 0
+
+    def roll(self):
+        i = self.next_face
+        if i + 2 > len(self.faces):
+            self.faces = self.rng.choices(FACES, k=2 * self.batch_size)
+            i = 0
+        self.values = (self.faces[i], self.faces[i + 1])
+        self.next_face = i + 2
+        return self.values
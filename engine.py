@@ -0,0 +1,519 @@
+# engine.py
+
+import copy
+import random
+import struct
+from board import Board
+from player import Player
+from dice import Dice, BufferedDice
+from config import PLAYER_COLORS, WARP_REFRESH_TURNS
+from zobrist import zobrist_keys, HASH_MASK
+
+WINNING_SCORE = 5
+
+NONE_BYTE = 255  # Snapshot marker for "home", "no placed token" and "no winner"
+_SNAPSHOT_STRUCTS = {}
+
+# Kinds of the events step() returns, and how many small-int arguments each has
+EVENT_KINDS = ["roll", "skip", "place", "move", "loop", "capture", "warp",
+               "extra_roll", "end_turn", "warp_refresh", "win"]
+EVENT_SIZES = {"roll": 3, "skip": 1, "place": 3, "move": 4, "loop": 2, "capture": 4, "warp": 4,
+               "extra_roll": 1, "end_turn": 1, "warp_refresh": 4, "win": 1}
+
+# A diff takes a copy of a game over one step without running the rules:
+#   turn state   current player, rolled | used_six << 1 | capture << 2, steps left,
+#                dice, placed token, winner, turns played
+#   events       count, then per event its EVENT_KINDS index and arguments
+#   tokens       count, then player, token, tile or NONE_BYTE, loops, captures
+#   scores       count, then player, score
+DIFF_TURN = struct.Struct("<BBBBBBBI")
+DIFF_TOKEN = struct.Struct("<BBBHB")
+DIFF_SCORE = struct.Struct("<BB")
+NUM_WARPS = 4  # Warp tiles at the start of a keyframe
+
+# Actions accepted by GameState.step
+ROLL = "roll"    # (ROLL,) or (ROLL, die1, die2) to force the dice values
+PLACE = "place"  # (PLACE, token_id) - bring a home token in using a six
+MOVE = "move"    # (MOVE, token_id, steps) - spend steps on a board token
+
+
+def create_players(ai_flags):
+    """Create players for the given seats, one flag per seat (True = AI)"""
+    colors = list(PLAYER_COLORS.values())
+    return [Player(player_id=i, is_ai=is_ai, color=colors[i])
+            for i, is_ai in enumerate(ai_flags)]
+
+
+def game_rngs(seed):
+    """Separate random streams for the dice and the warp zones of one game.
+
+    A game only depends on its own seed, so seeded games can be spread
+    over any number of processes and still come out the same.
+    """
+    return random.Random(f"dice-{seed}"), random.Random(f"warps-{seed}")
+
+
+def seeded_game(ai_flags, seed, board=None):
+    """A new game with its dice and warp zones drawn from game_rngs(seed).
+
+    The board can be reused between games; it gets the new warp stream and
+    fresh warp zones.
+    """
+    dice_rng, warp_rng = game_rngs(seed)
+    if board is None:
+        board = Board(warp_rng)
+    else:
+        board.rng = warp_rng
+        board.update_warp_zones()
+    return GameState(create_players(ai_flags), board, BufferedDice(dice_rng))
+
+
+class GameState:
+    """Rules of the game without any rendering, input handling or delays.
+
+    Every call to step() applies one action for the current player and
+    returns the list of events it produced, as tuples:
+
+        ("roll", player_id, die1, die2)
+        ("skip", player_id)
+        ("place", player_id, token_id, tile)
+        ("move", player_id, token_id, from_tile, to_tile)
+        ("loop", player_id, token_id)
+        ("capture", player_id, victim_id, victim_token_id, tile)
+        ("warp", player_id, token_id, from_tile, to_tile)
+        ("extra_roll", player_id)
+        ("end_turn", player_id)
+        ("warp_refresh", warp_indices)
+        ("win", player_id)
+    """
+
+    def __init__(self, players, board=None, dice=None):
+        self.board = board if board is not None else Board()
+        self.players = players
+        self.dice = dice if dice is not None else Dice()
+        self.current_player_index = 0
+        self.turns_played = 0
+        self.rolled = False
+        self.remaining_steps = 0
+        self.used_six = False
+        self.placed_token = None
+        self.capture_occurred_this_turn = False
+        self.winner = None
+        self.freeze_warps = False
+
+        for player in players:
+            for token in player.tokens:
+                token.in_home = True
+                token.position = None
+
+        # Tile -> tokens standing on it (occupied tiles only), plus a bitmask
+        # of occupied outer tiles per player
+        self.occupants = {}
+        self.occupied_mask = {player.id: 0 for player in players}
+        self.safe_mask = sum(1 << tile for tile in self.board.safe_tiles)
+
+        # Sum of the Zobrist keys of every token, score and warp tile, kept up to date on each change
+        self.zobrist_keys = zobrist_keys(len(self.board.tiles))
+        self.zobrist = sum(self.zobrist_keys.token_key(t) for p in players for t in p.tokens)
+        self.zobrist += sum(self.zobrist_keys.score_key(p.id, p.score) for p in players)
+        self.zobrist += sum(self.zobrist_keys.warp[i] for i in self.board.warp_indices)
+
+    @property
+    def current_player(self):
+        return self.players[self.current_player_index]
+
+    @property
+    def game_over(self):
+        return self.winner is not None
+
+    def copy(self, board=None):
+        """Copy for look-ahead search.
+
+        Tokens, scores, dice and turn state are copied. The board is shared
+        unless another is given, so the copy never refreshes warp zones (that
+        would change the original game's board too).
+        """
+        clone = copy.copy(self)
+        if board is not None:
+            clone.board = board
+        clone.players = [player.clone() for player in self.players]
+        by_id = {player.id: player for player in clone.players}
+
+        clone.dice = copy.copy(self.dice)
+        clone.occupants = {tile: [by_id[t.player_id].tokens[t.token_id] for t in tokens]
+                           for tile, tokens in self.occupants.items()}
+        clone.occupied_mask = dict(self.occupied_mask)
+        if self.placed_token is not None:
+            clone.placed_token = by_id[self.placed_token.player_id].tokens[self.placed_token.token_id]
+        if self.winner is not None:
+            clone.winner = by_id[self.winner.id]
+        clone.freeze_warps = True
+        return clone
+
+    def snapshot(self):
+        """Pack tokens, scores, dice and turn state into a few dozen bytes.
+
+        restore() puts a state back from its snapshot, which gives search an
+        undo that is cheaper to keep around than a copy.
+        """
+        placed = self.placed_token.token_id if self.placed_token is not None else NONE_BYTE
+        winner = self.players.index(self.winner) if self.winner is not None else NONE_BYTE
+        fields = [self.current_player_index, self.rolled, self.remaining_steps, self.used_six,
+                  self.capture_occurred_this_turn, self.dice.values[0], self.dice.values[1],
+                  placed, winner, self.turns_played, self.zobrist & HASH_MASK]
+        for player in self.players:
+            fields.append(player.score)
+            for token in player.tokens:
+                fields.append(NONE_BYTE if token.in_home else token.position)
+                fields.append(token.loops_completed)
+                fields.append(token.captures)
+        return self._snapshot_struct().pack(*fields)
+
+    def restore(self, data):
+        """Return the state to a snapshot() taken from this game"""
+        fields = self._snapshot_struct().unpack(data)
+        (self.current_player_index, self.rolled, self.remaining_steps, self.used_six,
+         self.capture_occurred_this_turn, die1, die2, placed, winner, self.turns_played,
+         self.zobrist) = fields[:11]
+        self.dice.values = (die1, die2)
+
+        self.occupants = {}
+        i = 11
+        for player in self.players:
+            player.score = fields[i]
+            i += 1
+            self.occupied_mask[player.id] = 0
+            for token in player.tokens:
+                position, token.loops_completed, token.captures = fields[i:i + 3]
+                i += 3
+                token.in_home = position == NONE_BYTE
+                token.position = None if token.in_home else position
+                token.update_status()
+                if not token.in_home:
+                    self.occupants.setdefault(position, []).append(token)
+                    self.occupied_mask[player.id] |= 1 << position
+
+        self.placed_token = self.current_player.tokens[placed] if placed != NONE_BYTE else None
+        self.winner = self.players[winner] if winner != NONE_BYTE else None
+
+    def _snapshot_struct(self):
+        num_players = len(self.players)
+        if num_players not in _SNAPSHOT_STRUCTS:
+            # turn state, then per player: score and (position, loops, captures) per token
+            tokens = "BHB" * len(self.players[0].tokens)
+            _SNAPSHOT_STRUCTS[num_players] = struct.Struct("<B?B??BBBBIQ" + ("B" + tokens) * num_players)
+        return _SNAPSHOT_STRUCTS[num_players]
+
+    def diff(self, before, events):
+        """Bytes that take a copy of the game from snapshot before to now.
+
+        before is the snapshot() from just ahead of the step that returned
+        events; only the tokens and scores that changed are included.
+        """
+        old = self._snapshot_struct().unpack(before)
+        new = self._snapshot_struct().unpack(self.snapshot())
+        flags = self.rolled | self.used_six << 1 | self.capture_occurred_this_turn << 2
+        data = bytearray(DIFF_TURN.pack(new[0], flags, new[2], *new[5:10]))
+
+        data.append(len(events))
+        for event in events:
+            data.append(EVENT_KINDS.index(event[0]))
+            data.extend(event[1] if event[0] == "warp_refresh" else event[1:])
+
+        tokens = []
+        scores = []
+        i = 11
+        for player in self.players:
+            if old[i] != new[i]:
+                scores.append(DIFF_SCORE.pack(player.id, new[i]))
+            i += 1
+            for token in player.tokens:
+                if old[i:i + 3] != new[i:i + 3]:
+                    tokens.append(DIFF_TOKEN.pack(player.id, token.token_id, *new[i:i + 3]))
+                i += 3
+        data.append(len(tokens))
+        data.extend(b"".join(tokens))
+        data.append(len(scores))
+        data.extend(b"".join(scores))
+        return bytes(data)
+
+    def apply_diff(self, data):
+        """Bring a copy of the game up to date with a diff(); returns the step's events"""
+        (self.current_player_index, flags, self.remaining_steps, die1, die2, placed, winner,
+         self.turns_played) = DIFF_TURN.unpack_from(data)
+        self.rolled = bool(flags & 1)
+        self.used_six = bool(flags & 2)
+        self.capture_occurred_this_turn = bool(flags & 4)
+        self.dice.values = (die1, die2)
+        self.placed_token = self.current_player.tokens[placed] if placed != NONE_BYTE else None
+        self.winner = self.players[winner] if winner != NONE_BYTE else None
+
+        pos = DIFF_TURN.size
+        events = []
+        for _ in range(data[pos]):
+            kind = EVENT_KINDS[data[pos + 1]]
+            args = tuple(data[pos + 2:pos + 2 + EVENT_SIZES[kind]])
+            pos += 1 + EVENT_SIZES[kind]
+            if kind == "warp_refresh":
+                self.set_warp_zones(args)
+                events.append((kind, args))
+            else:
+                events.append((kind,) + args)
+        pos += 1
+
+        keys = self.zobrist_keys
+        for _ in range(data[pos]):
+            player_id, token_id, position, loops, captures = DIFF_TOKEN.unpack_from(data, pos + 1)
+            pos += DIFF_TOKEN.size
+            token = self.players[player_id].tokens[token_id]
+            if token.in_home:
+                self.zobrist -= keys.token_key(token)
+            else:
+                self._remove_token(token)
+            token.loops_completed = loops
+            token.captures = captures
+            token.update_status()
+            token.in_home = position == NONE_BYTE
+            token.position = None if token.in_home else position
+            if token.in_home:
+                self.zobrist += keys.token_key(token)
+            else:
+                self._add_token(token)
+        pos += 1
+
+        for _ in range(data[pos]):
+            player_id, score = DIFF_SCORE.unpack_from(data, pos + 1)
+            pos += DIFF_SCORE.size
+            player = self.players[player_id]
+            self._add_score(player, score - player.score)
+        return events
+
+    def keyframe(self):
+        """The warp tiles and snapshot(): everything a copy of the game needs to catch up"""
+        return bytes(self.board.warp_indices) + self.snapshot()
+
+    def load_keyframe(self, data):
+        """Replace the whole state of a copy of the game with a keyframe()"""
+        self.set_warp_zones(tuple(data[:NUM_WARPS]))
+        self.restore(data[NUM_WARPS:])
+
+    def hash_key(self):
+        """64-bit hash of the position, including whose turn it is and what is left of the roll"""
+        keys = self.zobrist_keys
+        key = self.zobrist + keys.to_move[self.current_player.id]
+        if self.rolled:
+            key += keys.rolled + keys.remaining[self.remaining_steps]
+            if not self.used_six and 6 in self.dice.values:
+                key += keys.six_available
+            if self.capture_occurred_this_turn:
+                key += keys.capture_this_roll
+        return key & HASH_MASK
+
+    def _add_token(self, token):
+        """Put a board token into the occupancy index and hash"""
+        self.occupants.setdefault(token.position, []).append(token)
+        self.occupied_mask[token.player_id] |= 1 << token.position
+        self.zobrist += self.zobrist_keys.token_key(token)
+
+    def _remove_token(self, token):
+        """Take a board token out of the occupancy index and hash"""
+        tokens = self.occupants[token.position]
+        tokens.remove(token)
+        if not tokens:
+            del self.occupants[token.position]
+        if not any(t.player_id == token.player_id for t in tokens):
+            self.occupied_mask[token.player_id] &= ~(1 << token.position)
+        self.zobrist -= self.zobrist_keys.token_key(token)
+
+    def _add_score(self, player, points):
+        keys = self.zobrist_keys
+        self.zobrist -= keys.score_key(player.id, player.score)
+        player.score += points
+        self.zobrist += keys.score_key(player.id, player.score)
+
+    def enemies_at(self, player_id, tile):
+        """Tokens of other players standing on the tile"""
+        return [t for t in self.occupants.get(tile, ()) if t.player_id != player_id]
+
+    def capturable_mask(self, player_id):
+        """Bitmask of outer tiles holding an enemy token that can be captured"""
+        mask = 0
+        for pid, occupied in self.occupied_mask.items():
+            if pid != player_id:
+                mask |= occupied
+        return mask & ~self.safe_mask
+
+    def nearest_capture(self, player_id, tile, max_steps):
+        """Steps (1..max_steps) to the closest capturable enemy ahead of tile, or None"""
+        total = self.board.total_outer_tiles
+        mask = self.capturable_mask(player_id)
+        shift = (tile + 1) % total
+        # Rotate so bit k means "k + 1 steps ahead of tile"
+        ahead = ((mask >> shift) | (mask << (total - shift))) & ((1 << max_steps) - 1)
+        if not ahead:
+            return None
+        return (ahead & -ahead).bit_length()
+
+    def enemy_within(self, player_id, tile, max_steps):
+        """Check if any capturable enemy is 1..max_steps tiles ahead of tile"""
+        return self.nearest_capture(player_id, tile, max_steps) is not None
+
+    def can_place(self):
+        """Check if the current player may bring a home token in this roll"""
+        return (self.rolled and not self.used_six
+                and 6 in self.dice.values and self.remaining_steps >= 6
+                and any(t.in_home for t in self.current_player.tokens))
+
+    def legal_actions(self):
+        """List every action the current player may take right now"""
+        if self.game_over:
+            return []
+        if not self.rolled:
+            return [(ROLL,)]
+
+        actions = []
+        player = self.current_player
+        if self.can_place():
+            actions.extend((PLACE, t.token_id) for t in player.tokens if t.in_home)
+        for token in player.tokens:
+            if not token.in_home:
+                actions.extend((MOVE, token.token_id, step)
+                               for step in range(1, self.remaining_steps + 1))
+        return actions
+
+    def set_warp_zones(self, warp_indices=None):
+        """Move the warp zones to the given tiles, or to random ones when None"""
+        self.zobrist -= sum(self.zobrist_keys.warp[i] for i in self.board.warp_indices)
+        if warp_indices is None:
+            self.board.update_warp_zones()
+        else:
+            self.board.set_warp_zones(warp_indices)
+        self.zobrist += sum(self.zobrist_keys.warp[i] for i in self.board.warp_indices)
+
+    def step(self, action):
+        """Apply one action for the current player and return its events"""
+        if self.game_over:
+            raise ValueError("The game is already over")
+
+        events = []
+        kind = action[0]
+        if kind == ROLL:
+            self._roll(action[1:], events)
+        elif kind == PLACE:
+            self._place(action[1], events)
+        elif kind == MOVE:
+            self._move(action[1], action[2], events)
+        else:
+            raise ValueError(f"Unknown action: {action!r}")
+        return events
+
+    def _roll(self, values, events):
+        if self.rolled:
+            raise ValueError("Dice already rolled, move a token first")
+
+        player = self.current_player
+        if values:
+            self.dice.values = tuple(values)
+        else:
+            self.dice.roll()
+        self.rolled = True
+        self.remaining_steps = self.dice.total()
+        self.used_six = False
+        self.placed_token = None
+        self.capture_occurred_this_turn = False
+        events.append(("roll", player.id) + tuple(self.dice.values))
+
+        has_tokens_on_board = any(not t.in_home for t in player.tokens)
+        if not has_tokens_on_board and 6 not in self.dice.values:
+            events.append(("skip", player.id))
+            self._end_turn(events)
+
+    def _place(self, token_id, events):
+        player = self.current_player
+        token = player.tokens[token_id]
+        if not self.can_place() or not token.in_home:
+            raise ValueError(f"Player {player.id + 1} can't place token {token_id}")
+
+        self.zobrist -= self.zobrist_keys.token_key(token)
+        token.in_home = False
+        token.position = self.board.player_start_tiles[player.id]
+        self._add_token(token)
+        self.remaining_steps -= 6
+        self.used_six = True
+        self.placed_token = token
+        events.append(("place", player.id, token_id, token.position))
+        if self.remaining_steps == 0:
+            self._finish_roll(events)
+
+    def _move(self, token_id, steps, events):
+        player = self.current_player
+        board = self.board
+        token = player.tokens[token_id]
+        if not self.rolled or token.in_home or not 1 <= steps <= self.remaining_steps:
+            raise ValueError(f"Player {player.id + 1} can't move token {token_id} by {steps}")
+
+        old_pos = token.position
+        new_pos = board.destinations[old_pos][steps]
+        self._remove_token(token)
+        token.position = new_pos
+        self.remaining_steps -= steps
+        events.append(("move", player.id, token_id, old_pos, new_pos))
+
+        if board.check_loop_completion(player.id, token, old_pos, new_pos):
+            token.loops_completed += 1
+            token.update_status()
+            events.append(("loop", player.id, token_id))
+
+        # Start tiles are safe zones
+        if new_pos not in board.safe_tiles:
+            for t in self.enemies_at(player.id, new_pos):
+                self._remove_token(t)
+                t.in_home = True
+                t.position = None
+                self.zobrist += self.zobrist_keys.token_key(t)
+                self._add_score(player, 1)
+                self.capture_occurred_this_turn = True
+                events.append(("capture", player.id, t.player_id, t.token_id, new_pos))
+
+        if board.tiles[new_pos].is_warp:
+            token.position = board.get_next_warp(new_pos)
+            events.append(("warp", player.id, token_id, new_pos, token.position))
+        self._add_token(token)
+
+        if player.score >= WINNING_SCORE:
+            self.winner = player
+            self.rolled = False
+            events.append(("win", player.id))
+            return
+
+        if self.remaining_steps == 0:
+            self._finish_roll(events)
+
+    def _finish_roll(self, events):
+        """All steps of the roll are spent: roll again after a capture, else pass the turn"""
+        if self.capture_occurred_this_turn:
+            self.rolled = False
+            self.capture_occurred_this_turn = False
+            events.append(("extra_roll", self.current_player.id))
+        else:
+            self._end_turn(events)
+
+    def _end_turn(self, events):
+        events.append(("end_turn", self.current_player.id))
+        self.rolled = False
+        self.remaining_steps = 0
+        self.current_player_index = (self.current_player_index + 1) % len(self.players)
+        self.turns_played += 1
+
+        if not self.freeze_warps and self.turns_played % WARP_REFRESH_TURNS == 0:
+            self.set_warp_zones()
+            events.append(("warp_refresh", tuple(self.board.warp_indices)))
+
+
+def play_game(state, policies, max_turns=None):
+    """Run a game to the end; policies[seat](state) returns the next action"""
+    while not state.game_over:
+        if max_turns is not None and state.turns_played >= max_turns:
+            break
+        state.step(policies[state.current_player_index](state))
+    return state
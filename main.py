@@ -1,13 +1,40 @@
+import argparse
 import random
+from collections import deque
 import pygame
 from board import Board
-from player import Player
 from dice import Dice
+from engine import GameState, create_players, game_rngs, ROLL, PLACE, MOVE
+from ai import POLICIES, BackgroundAI
+from renderer import Renderer, TextCache, circle_sprite, text_sprite
+from clicks import build_click_index
+from record import GameRecorder
+from profiler import FrameProfiler
+from client import ThreadedClient
 import math
 from config import BOARD_WIDTH, BOARD_HEIGHT, BACKGROUND_COLOR, TILE_SIZE
 from config import PLAYER_COLORS
 
-WINNING_SCORE = 5
+# AI pacing, so human players can follow what it does
+AI_ROLL_DELAY_MS = 500
+AI_MOVE_DELAY_MS = 300
+AI_TURN_END_DELAY_MS = 400
+
+# The AI thinks on a worker thread; past the cap it plays the greedy move
+AI_POLICY = "greedy"
+AI_MAX_THINK_MS = 2000
+AI_POLL_MS = 20
+
+# Every local game is appended here unless --record says otherwise; replay with python record.py
+RECORD_PATH = "games.rec"
+
+# F3 shows frame timings, F4 saves the recent ones as a Chrome trace
+TRACE_PATH = "trace.json"
+
+# Only changed areas are pushed to the window, so after one of these the
+# whole of it is repainted
+REPAINT_EVENTS = (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED,
+                  pygame.WINDOWSHOWN, pygame.WINDOWSIZECHANGED)
 
 def get_players():
     print("Select number of human players (1 to 4): ")
@@ -19,17 +46,8 @@ def get_players():
         except ValueError:
             print("Invalid input. Enter a number.")
 
-    total_players = human_count + 1 # Always 1 AI
-    players = []
-
-    available_colors = list(PLAYER_COLORS.values())[:total_players]
-
-    for i in range(human_count):
-        players.append(Player(player_id=i, is_ai=False, color=available_colors[i]))
-
-    players.append(Player(player_id=human_count, is_ai=True, color=available_colors[human_count]))
-
-    return players
+    # Always 1 AI
+    return create_players([False] * human_count + [True])
 
 def init_game():
     pygame.init()
@@ -37,6 +55,20 @@ def init_game():
     pygame.display.set_caption("Ludo: Capture Edition")
     return screen
 
+def wait_for_match(screen, net, text_cache, num_players):
+    """Keep the window responsive until net's match starts; returns whether it did"""
+    text = text_cache.render(f"Waiting for {num_players - 1} more players...", "large")
+    while net.client is None and net.failed is None:
+        screen.fill(BACKGROUND_COLOR)
+        screen.blit(text, (BOARD_WIDTH//2 - text.get_width()//2, BOARD_HEIGHT//2 - text.get_height()//2))
+        pygame.display.flip()
+        if any(event.type == pygame.QUIT for event in [pygame.event.wait()] + pygame.event.get()):
+            return False
+    if net.failed is not None:
+        print(f"Could not join a match: {net.failed}")
+        return False
+    return True
+
 def assign_base_positions(players):
     center_x, center_y = 400, 400
     radius = 300
@@ -57,472 +89,334 @@ def assign_base_positions(players):
             (int(base_x + offset * 0.7), int(base_y + offset * 0.7)),
         ]
 
-def check_winner(players):
+def home_slot_positions(players):
+    """Centers of the four home token slots of each player"""
+    token_offset = 15
+    base_radius = 320
+    slots = {}
     for player in players:
-        if player.score >= WINNING_SCORE:
-            return player
+        angle_deg = 90 + player.id * (360 / len(PLAYER_COLORS))
+        angle_rad = math.radians(angle_deg)
+        base_x = 400 + base_radius * math.cos(angle_rad)
+        base_y = 400 - base_radius * math.sin(angle_rad)
+        slots[player.id] = [(int(base_x - token_offset + (j % 2) * 2 * token_offset),
+                             int(base_y - token_offset + (j // 2) * 2 * token_offset))
+                            for j in range(len(player.tokens))]
+    return slots
+
+def describe_event(event, players):
+    """Turn an engine event into a log line"""
+    kind, pid = event[0], event[1]
+    if kind == "warp_refresh":
+        return "Warp zones have moved!"
+    name = ("AI Player" if players[pid].is_ai else "Player") + f" {pid + 1}"
+    if kind == "roll":
+        return f"{name} rolled {event[2] + event[3]}"
+    if kind == "skip":
+        return f"{name} can't move. Turn skipped."
+    if kind == "place":
+        return f"{name} placed a new token using six"
+    if kind == "move":
+        return f"{name} moved to {event[4]}"
+    if kind == "loop":
+        return "Token completed a full loop around the board!"
+    if kind == "capture":
+        return f"{name} captured Player {event[2] + 1}'s token at {event[4]}!"
+    if kind == "warp":
+        return f"WARP! {event[3]} → {event[4]}"
+    if kind == "extra_roll":
+        return f"{name} gets an extra roll for capturing!"
+    if kind == "win":
+        return f"{name} wins!"
     return None
 
-def evaluate_token_moves(current_player, board, players, steps):
-    best_token = None
-    best_score = -float('inf')
-
-    for token in current_player.tokens:
-        if token.in_home or token.position is None:
-            continue
-
-        new_pos = (token.position + steps) % board.total_outer_tiles
-        score = 0
-
-        # Score for capturing
-        for other in players:
-            if other.id == current_player.id:
-                continue
-            for t in other.tokens:
-                if t.position == new_pos and not t.in_home:
-                    if new_pos not in board.player_start_tiles.values():  # not a safe zone
-                        score += 10
+def get_possible_moves(state, token):
+    return [(state.board.destinations[token.position][step], step)
+            for step in range(1, state.remaining_steps + 1)]
 
-        # Score for warp zone
-        if board.tiles[new_pos].is_warp:
-            score += 5
+def game_loop(screen, seed=None, trace_path=None, connect=None, record_path=RECORD_PATH):
+    """Play a local game, or with connect=(host, port, players) a seat of an online match.
 
-        # Add steps as minor progress
-        score += steps
-
-        if score > best_score:
-            best_score = score
-            best_token = token
-
-    return best_token
-
-def game_loop(screen):
+    Local games are appended to record_path, unless it is empty.
+    """
     running = True
-    clock = pygame.time.Clock()
-    board = Board()
-    board.update_warp_zones()
-    dice = Dice()
-    current_player_index = 0
+    if seed is None:
+        seed = random.randrange(1 << 32)
+    # The dice and warp zones have their own streams; AIs that play randomly use the global one
+    dice_rng, warp_rng = game_rngs(seed)
+    random.seed(seed)
+    board = Board(warp_rng)
+    dice = Dice(dice_rng)
     space_pressed = False
-    rolled = False
-    log_messages = []
-    turns_played = 0
+    log_messages = deque(maxlen=8)
     selected_token = None
     possible_moves = []
-    remaining_steps = 0
     show_trail = False
-    home_token_positions = {}
-    token_placed_this_turn = False
     AI_DELAY_EVENT = pygame.USEREVENT + 1
-    used_six = False
-
-    players = get_players()
+    NET_EVENT = pygame.USEREVENT + 2
+    ai_turn = None
+    show_profile = False
+
+    text_cache = TextCache()
+    net = None
+    if connect is None:
+        players = get_players()
+        state = GameState(players, board, dice)
+    else:
+        # The server rolls the dice and moves the warps; this is a copy of its state
+        net = ThreadedClient(*connect, on_message=lambda: pygame.event.post(pygame.event.Event(NET_EVENT)))
+        if not wait_for_match(screen, net, text_cache, connect[2]):
+            net.close()
+            pygame.quit()
+            return
+        # Messages may have come in while waiting, with their events used up
+        pygame.event.post(pygame.event.Event(NET_EVENT))
+        state = net.client.state
+        board, dice, players = state.board, state.dice, state.players
+        log_messages.append(f"Joined match {net.client.match_id} as Player {net.client.seat + 1}")
     assign_base_positions(players)
+    profiler = FrameProfiler()
+    renderer = Renderer(screen, board, profiler)
+    home_slots = home_slot_positions(players)
+    click_index = build_click_index(board, home_slots)
+    ai = BackgroundAI(POLICIES[AI_POLICY], AI_MAX_THINK_MS)
+    # Online matches are recorded by the server
+    record_file = recorder = None
+    if net is None and record_path:
+        try:
+            record_file = open(record_path, "ab")
+        except OSError as e:
+            # Not being able to record is no reason not to play
+            log_messages.append(f"Not recording this game: {e.strerror}")
+        else:
+            recorder = GameRecorder(record_file)
+            recorder.start(state, seed)
+
+    def human_turn(player):
+        if net is None:
+            return not player.is_ai
+        return player.id == net.client.seat and not net.client.finished
+
+    def apply(action):
+        if net is None:
+            events = state.step(action)
+            if recorder:
+                recorder.record(action, events)
+            show_events(events)
+        elif not net.pending:
+            # The server's reply arrives as a NET_EVENT
+            net.send(action)
+
+    def show_events(events):
+        for event in events:
+            message = describe_event(event, players)
+            if message:
+                log_messages.append(message)
+
+    def play_ai_turn(player):
+        """The AI's turn as a script: yields how long to pause, in ms, before going on"""
+        while state.current_player is player and not state.game_over:
+            yield AI_ROLL_DELAY_MS
+            apply((ROLL,))
+            yield AI_MOVE_DELAY_MS
+            while state.rolled and state.current_player is player:
+                ai.think(state)
+                action = ai.poll()
+                while action is None:
+                    yield AI_POLL_MS
+                    action = ai.poll()
+                apply(action)
+        if not state.game_over:
+            yield AI_TURN_END_DELAY_MS
+
+    # Mouse motion isn't used and would only wake the loop up
+    pygame.event.set_blocked(pygame.MOUSEMOTION)
+
+    # Whatever ends the game, its record gets its END byte
+    try:
+        while running:
+            current_player = state.current_player
+            is_human = human_turn(current_player)
+
+            winner = state.winner
+            if winner:
+                win_text = text_cache.render(f"Player {winner.id + 1} wins!", "banner", winner.color)
+                screen.fill(BACKGROUND_COLOR)
+                screen.blit(win_text, (BOARD_WIDTH//2 - win_text.get_width()//2, 
+                                      BOARD_HEIGHT//2 - win_text.get_height()//2))
+                pygame.display.flip()
+                pygame.time.delay(3000)
+                running = False
+                break
 
-    for player in players:
-        for token in player.tokens:
-            token.in_home = True
+            board.update_trail(current_player.id, None)
 
-    capture_occurred_this_turn = False
+            # Handle dice roll
+            if is_human and space_pressed and not state.rolled:
+                apply((ROLL,))
 
-    while running:
-        screen.fill(BACKGROUND_COLOR)
-        current_player = players[current_player_index]
-        is_human = not current_player.is_ai
-
-        winner = check_winner(players)
-        if winner:
-            font = pygame.font.SysFont(None, 72)
-            win_text = font.render(f"Player {winner.id + 1} wins!", True, winner.color)
-            screen.blit(win_text, (BOARD_WIDTH//2 - win_text.get_width()//2, 
-                                  BOARD_HEIGHT//2 - win_text.get_height()//2))
-            pygame.display.flip()
-            pygame.time.delay(3000)
-            running = False
-            break
-
-        if current_player.id in board.player_trail_positions:
-            for idx in board.player_trail_positions[current_player.id]:
-                if 0 <= idx < len(board.tiles):
-                    board.tiles[idx].has_trail = False
-            board.player_trail_positions[current_player.id] = []
-            
-        can_move_from_home = any(t.in_home for t in current_player.tokens)
-        has_tokens_on_board = any(not t.in_home for t in current_player.tokens)
-        rolled_a_six = rolled and (6 in dice.values)
-        
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-                space_pressed = True
-            elif event.type == pygame.KEYUP and event.key == pygame.K_SPACE:
-                space_pressed = False
-            elif event.type == pygame.MOUSEBUTTONDOWN and is_human and rolled:
-                mouse_pos = event.pos
-                token_clicked = False
-
-                if show_trail and selected_token is not None and selected_token.position is not None:
-                    # Check if clicked on an available move
-                    for move, step in possible_moves:
-                        tile = board.tiles[move]
-                        tile_rect = pygame.Rect(tile.x, tile.y, TILE_SIZE, TILE_SIZE)
-                        if tile_rect.collidepoint(mouse_pos):
-                            # Move the token to the selected spot
-                            old_pos = selected_token.position
-                            selected_token.position = move
-                            remaining_steps -= step
-                            
-                            # Check for completed loops
-                            if board.check_loop_completion(current_player.id, selected_token, old_pos, move):
-                                selected_token.loops_completed += 1
-                                selected_token.update_status()
-                                log_messages.append(f"Token completed a full loop around the board!")
-                            
-                            # Capture check
-                            for other in players:
-                                if other.id != current_player.id:
-                                    for t in other.tokens:
-                                        if not t.in_home and t.position == move:
-                                            # Skip capture if the tile is a base/start tile (safe zone)
-                                            if move in board.player_start_tiles.values():
-                                                continue
-                                            t.in_home = True
-                                            t.position = None
-                                            current_player.score += 1
-                                            capture_occurred_this_turn = True
-                                            log_messages.append(f"Player {current_player.id + 1} captured Player {other.id + 1}'s token!")
-
-                            # Warp zone logic
-                            if board.tiles[move].is_warp:
-                                old = move
-                                selected_token.position = board.get_next_warp(move)
-                                log_messages.append(f"WARP! {old} → {selected_token.position}")
-
-                            # If there are no remaining steps, reset the token selection
-                            if remaining_steps == 0:
-                                if capture_occurred_this_turn:
-                                    rolled = False
-                                    log_messages.append(f"Player {current_player.id + 1} gets an extra roll for capturing!")
-                                    capture_occurred_this_turn = False
-                                else:
-                                    selected_token = None
-                                    possible_moves = []
-                                    show_trail = False
-                                    rolled = False
-                                    current_player_index = (current_player_index + 1) % len(players)
-                                    turns_played += 1
-                                    token_placed_this_turn = False
-
-                            else:
-                                # In possible moves calculation:
-                                possible_moves = []
-                                if selected_token.position is not None:
-                                    for step in range(1, remaining_steps + 1):
-                                        new_pos = (selected_token.position + step) % board.total_outer_tiles
-                                        possible_moves.append((new_pos, step))
-                                show_trail = True
-                            break
-
-                if has_tokens_on_board:
-                    for token in current_player.tokens:
+            # AI turns run on a one-shot timer instead of blocking delays
+            if state.current_player.is_ai and ai_turn is None:
+                ai_turn = play_ai_turn(state.current_player)
+                pygame.time.set_timer(AI_DELAY_EVENT, next(ai_turn), 1)
+
+            with profiler.phase("tokens"):
+                # Draw tokens; the board itself is cached by the renderer
+                sprites = []
+                for player in players:
+                    for token in player.tokens:
                         if not token.in_home and token.position is not None:
                             tile = board.tiles[token.position]
-                            tile_rect = pygame.Rect(tile.x, tile.y, TILE_SIZE, TILE_SIZE)
-                            if tile_rect.collidepoint(mouse_pos):
-                                selected_token = token
-                                # In possible moves calculation:
-                                possible_moves = []
-                                for step in range(1, remaining_steps + 1):
-                                    new_pos = (token.position + step) % board.total_outer_tiles
-                                    possible_moves.append((new_pos, step))
-                                show_trail = True
-                                token_clicked = True
+                            sprites.append(circle_sprite(("token", player.id, token.token_id, token.position),
+                                                         player.color, token.center(tile), TILE_SIZE // 5))
+
+                # Draw home tokens
+                for player in players:
+                    tokens_in_home = [t for t in player.tokens if t.in_home]
+                    for j, pos in enumerate(home_slots[player.id][:len(tokens_in_home)]):
+                        sprites.append(circle_sprite(("home", player.id, j), player.color, pos, TILE_SIZE // 5))
+
+                if show_trail:
+                    for move, _ in possible_moves:
+                        tile = board.tiles[move % board.total_outer_tiles]
+                        pos = (tile.x + TILE_SIZE//2, tile.y + TILE_SIZE//2)
+                        sprites.append(circle_sprite(("move", move), (180, 180, 180), pos, 6))
+
+            with profiler.phase("text"):
+                # Draw labels and scores
+                for player in players:
+                    angle_deg = 90 + player.id * (360 / len(PLAYER_COLORS))
+                    angle_rad = math.radians(angle_deg)
+                    lx = 400 + 380 * math.cos(angle_rad)
+                    ly = 400 - 380 * math.sin(angle_rad)
+                    label = f"Player {player.id + 1}" + (" (AI)" if player.is_ai else "") + f": {player.score}"
+                    text = text_cache.render(label)
+                    pos = (int(lx - text.get_width() // 2), int(ly - text.get_height() // 2))
+                    sprites.append(text_sprite(("label", player.id, label), text, pos))
+
+                # Dice & logs
+                roll = f"Roll: {dice.values[0]} + {dice.values[1]}"
+                dice_text = text_cache.render(roll, "large")
+                sprites.append(text_sprite(("dice", roll), dice_text, (20, 20)))
+                for i, msg in enumerate(log_messages):
+                    text = text_cache.render(msg)
+                    sprites.append(text_sprite(("log", i, msg), text, (20, 60 + i * 20)))
+
+                if show_profile:
+                    font = text_cache.fonts["small"]
+                    for i, line in enumerate(profiler.overlay_lines()):
+                        text = font.render(line, True, (0, 0, 0))
+                        sprites.append(text_sprite(("profile", i, line), text, (BOARD_WIDTH - 170, 10 + i * 18)))
+
+            with profiler.phase("render"):
+                renderer.render(sprites)
+            profiler.end_frame()
+
+            # Sleep until there is input or the AI timer fires
+            with profiler.phase("idle"):
+                events = [pygame.event.wait()] + pygame.event.get()
+            for event in events:
+                current_player = state.current_player
+                is_human = human_turn(current_player)
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type in REPAINT_EVENTS:
+                    renderer.invalidate()
+                elif event.type == AI_DELAY_EVENT and ai_turn is not None:
+                    with profiler.phase("ai"):
+                        delay = next(ai_turn, None)
+                    if delay is None:
+                        ai_turn = None
+                    else:
+                        pygame.time.set_timer(AI_DELAY_EVENT, delay, 1)
+                elif event.type == NET_EVENT and net is not None:
+                    show_events(net.poll())
+                    log_messages.extend(net.errors)
+                    net.errors.clear()
+                    # Moves sent for the selected token have now been applied
+                    if (selected_token is not None and not selected_token.in_home and state.rolled
+                            and human_turn(state.current_player)):
+                        possible_moves = get_possible_moves(state, selected_token)
+                        show_trail = True
+                    else:
+                        selected_token = None
+                        possible_moves = []
+                        show_trail = False
+                    if net.client.finished and state.winner is None:
+                        log_messages.append("The match ended without a winner")
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                    space_pressed = True
+                elif event.type == pygame.KEYUP and event.key == pygame.K_SPACE:
+                    space_pressed = False
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    show_profile = not show_profile
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                    profiler.dump_trace(TRACE_PATH)
+                    log_messages.append(f"Saved a frame trace to {TRACE_PATH}")
+                elif event.type == pygame.MOUSEBUTTONDOWN and is_human and state.rolled:
+                    hits = click_index.at(event.pos)
+                    hit_tiles = {key[1] for key in hits if key[0] == "tile"}
+                    clicked = False
+
+                    if show_trail and selected_token is not None and not selected_token.in_home:
+                        # Check if clicked on an available move
+                        for move, step in possible_moves:
+                            if move in hit_tiles:
+                                apply((MOVE, selected_token.token_id, step))
+                                clicked = True
                                 break
 
-                if not token_clicked and rolled_a_six and can_move_from_home and not token_placed_this_turn:
-                    six_index = 0 if dice.values[0] == 6 else 1
-                    other_die = dice.values[1] if six_index == 0 else dice.values[0]
-                    # First check if clicked on home token to bring it in
-                    for idx, token in enumerate(current_player.tokens):
-                        if token.in_home and (current_player.id, idx) in home_token_positions:
-                            draw_x, draw_y = home_token_positions[(current_player.id, idx)]
-                            token_rect = pygame.Rect(draw_x - TILE_SIZE // 5, draw_y - TILE_SIZE // 5, 
-                                                   TILE_SIZE // 2, TILE_SIZE // 2)
-                            if token_rect.collidepoint(mouse_pos):
-                                token.in_home = False
-                                token.position = board.player_start_tiles[current_player.id]
-                                selected_token = token
-                                remaining_steps = other_die
-                                used_six = True
-                                token_placed_this_turn = True
-                                log_messages.append(f"Player {current_player.id + 1} placed new token using six")
-                                if remaining_steps > 0:
-                                    # In possible moves calculation:
-                                    possible_moves = []
-                                    for step in range(1, remaining_steps + 1):
-                                        new_pos = (token.position + step) % board.total_outer_tiles
-                                        possible_moves.append((new_pos, step))
-                                    show_trail = True
-                                break
-                    
-                    # If not placing new token, check if clicking on existing board token
-                    if not token_placed_this_turn:
+                    # Select one of the player's tokens on the board
+                    if not clicked:
                         for token in current_player.tokens:
-                            if not token.in_home and token.position is not None:
-                                tile = board.tiles[token.position]
-                                tile_rect = pygame.Rect(tile.x, tile.y, TILE_SIZE, TILE_SIZE)
-                                if tile_rect.collidepoint(mouse_pos):
-                                    selected_token = token
-                                    possible_moves = [((token.position + step) % board.total_outer_tiles, step) 
-                                                    for step in range(1, dice.total() + 1)]
-                                    show_trail = True
-                                    log_messages.append(f"Player {current_player.id + 1} selected token at {token.position}")
-                                    break
-
-
-                # Handle moving home token onto the board
-                elif rolled_a_six and can_move_from_home and not has_tokens_on_board:
-                    for idx, token in enumerate(current_player.tokens):
-                        if token.in_home and (current_player.id, idx) in home_token_positions and not token_placed_this_turn:
-                            draw_x, draw_y = home_token_positions[(current_player.id, idx)]
-                            token_rect = pygame.Rect(draw_x - TILE_SIZE // 5, draw_y - TILE_SIZE // 5, TILE_SIZE // 2, TILE_SIZE // 2)
-                            if token_rect.collidepoint(mouse_pos):
-                                token.in_home = False
-                                token.position = board.player_start_tiles[current_player.id]
+                            if not token.in_home and token.position in hit_tiles:
                                 selected_token = token
-                                remaining_steps = dice.total() - 6
-                                if remaining_steps > 0:
-                                    possible_moves = [((token.position + step) % board.total_outer_tiles, step) for step in range(1, remaining_steps + 1)]
-                                    show_trail = True
-                                token_placed_this_turn = True  # Set the flag
+                                clicked = True
                                 break
 
-                # Handle moving an existing token on the board
-                elif has_tokens_on_board and not rolled_a_six:
-                    for token in current_player.tokens:
-                        if not token.in_home and token.position is not None:
-                            tile = board.tiles[token.position]
-                            tile_rect = pygame.Rect(tile.x, tile.y, TILE_SIZE, TILE_SIZE)
-                            if tile_rect.collidepoint(mouse_pos):
-                                # Select a new token and calculate the new possible moves
+                    # Bring a home token onto the board using a six
+                    if not clicked and state.can_place():
+                        tokens_in_home = [t for t in current_player.tokens if t.in_home]
+                        for key in hits:
+                            if key[0] == "home" and key[1] == current_player.id and key[2] < len(tokens_in_home):
+                                token = tokens_in_home[key[2]]
+                                apply((PLACE, token.token_id))
                                 selected_token = token
-                                possible_moves = [((token.position + step) % board.total_outer_tiles, step) for step in range(1, remaining_steps + 1)]
-                                show_trail = True
                                 break
 
-        # Draw board and tokens
-        board.draw(screen)
-        for player in players:
-            for token in player.tokens:
-                if not token.in_home and token.position is not None:
-                    tile = board.tiles[token.position]
-                    token.draw(screen, tile, player.color)
-
-        # Draw home tokens
-        token_offset = 15
-        base_radius = 320
-        for i, player in enumerate(players):
-            tokens_in_home = [t for t in player.tokens if t.in_home]
-            angle_deg = 90 + player.id * (360 / len(PLAYER_COLORS))
-            angle_rad = math.radians(angle_deg)
-            base_x = 400 + base_radius * math.cos(angle_rad)
-            base_y = 400 - base_radius * math.sin(angle_rad)
-            for j, token in enumerate(tokens_in_home):
-                dx = int(base_x - token_offset + (j % 2) * 2 * token_offset)
-                dy = int(base_y - token_offset + (j // 2) * 2 * token_offset)
-                pygame.draw.circle(screen, player.color, (dx, dy), TILE_SIZE // 5)
-                home_token_positions[(player.id, j)] = (dx, dy)
-
-        if show_trail:
-            for move, _ in possible_moves:
-                tile = board.tiles[move % board.total_outer_tiles]
-                pos = (tile.x + TILE_SIZE//2, tile.y + TILE_SIZE//2)
-                pygame.draw.circle(screen, (180, 180, 180), pos, 6)
-
-        # Draw labels and scores
-        font = pygame.font.SysFont(None, 24)
-        for player in players:
-            angle_deg = 90 + player.id * (360 / len(PLAYER_COLORS))
-            angle_rad = math.radians(angle_deg)
-            lx = 400 + 380 * math.cos(angle_rad)
-            ly = 400 - 380 * math.sin(angle_rad)
-            label = f"Player {player.id + 1}" + (" (AI)" if player.is_ai else "") + f": {player.score}"
-            text = font.render(label, True, (0, 0, 0))
-            screen.blit(text, (int(lx - text.get_width() // 2), int(ly - text.get_height() // 2)))
-
-        # Dice & logs
-        dice_text = pygame.font.SysFont(None, 36).render(f"Roll: {dice.values[0]} + {dice.values[1]}", True, (0, 0, 0))
-        screen.blit(dice_text, (20, 20))
-        for i, msg in enumerate(log_messages[-8:]):
-            text = font.render(msg, True, (0, 0, 0))
-            screen.blit(text, (20, 60 + i * 20))
-
-        # Handle dice roll
-        if is_human and space_pressed and not rolled:
-            dice.roll()
-            rolled = True
-            remaining_steps = dice.total()
-            used_six = False
-            capture_occurred_this_turn = False
-            log_messages.append(f"Player {current_player.id + 1} rolled {remaining_steps}")
-            if (6 not in dice.values and not has_tokens_on_board) or (not can_move_from_home and not has_tokens_on_board):
-                log_messages.append(f"Player {current_player.id + 1} can't move. Turn skipped.")
-                rolled = False
-                current_player_index = (current_player_index + 1) % len(players)
-                turns_played += 1
-                token_placed_this_turn = False
-
-        # AI turn logic
-        if not is_human and not rolled:
-            pygame.time.delay(500)
-            dice.roll()
-            rolled = True
-            remaining_steps = dice.total()
-            used_six = False
-            capture_occurred_this_turn = False
-            log_messages.append(f"AI Player {current_player.id + 1} rolled: {remaining_steps}")
-            pygame.time.delay(300)
-
-            if (6 not in dice.values and not has_tokens_on_board) or (not can_move_from_home and not has_tokens_on_board):
-                log_messages.append(f"AI Player {current_player.id + 1} can't move. Turn skipped.")
-                rolled = False
-                current_player_index = (current_player_index + 1) % len(players)
-                turns_played += 1
-                token_placed_this_turn = False
-                pygame.time.delay(400)
-                continue
-
-            moved = False
-            die1, die2 = dice.values
-            other_die = die2 if die1 == 6 else die1
-
-            # Step 1: Check all tokens for capture opportunities within remaining_steps
-            capture_made = False
-
-            for token in current_player.tokens:
-                if token.in_home or token.position is None:
-                    continue
-
-                for step in range(1, remaining_steps + 1):
-                    target_pos = (token.position + step) % board.total_outer_tiles
-
-                    for opponent in players:
-                        if opponent.id == current_player.id:
-                            continue
-                        for enemy_token in opponent.tokens:
-                            if (
-                                not enemy_token.in_home
-                                and enemy_token.position == target_pos
-                                and target_pos not in board.player_start_tiles.values()  # Skip safe zones
-                            ):
-                                # Capture logic
-                                enemy_token.in_home = True
-                                enemy_token.position = None
-                                current_player.score += 1
-                                capture_occurred_this_turn = True
-                                log_messages.append(
-                                    f"AI Player {current_player.id + 1} captured Player {opponent.id + 1}'s token at {target_pos}"
-                                )
-
-                                # Move token to capture position
-                                old_pos = token.position
-                                token.position = target_pos
-                                capture_made = True
-                                moved = True
-                                remaining_steps -= step
-
-                                # Loop completion
-                                if board.check_loop_completion(current_player.id, token, old_pos, target_pos):
-                                    token.loops_completed += 1
-                                    token.update_status()
-                                    log_messages.append("Token completed a full loop!")
-
-                                # Warp
-                                if board.tiles[token.position].is_warp:
-                                    warp_from = token.position
-                                    token.position = board.get_next_warp(warp_from)
-                                    log_messages.append(f"AI WARP! From {warp_from} to {token.position}")
-
-                                break
-                        if capture_made:
-                            break
-                    if capture_made:
-                        break
-                if capture_made:
-                    break
-
-            # Step 2: No capture, place new token if 6 rolled
-            just_placed_token = None
-            if not capture_made and 6 in dice.values and can_move_from_home and not used_six:
-                for token in current_player.tokens:
-                    if token.in_home:
-                        token.in_home = False
-                        token.position = board.player_start_tiles[current_player.id]
-                        remaining_steps = other_die
-                        used_six = True
-                        token_placed_this_turn = True
-                        has_tokens_on_board = any(not t.in_home for t in current_player.tokens)
-                        just_placed_token = token
-                        log_messages.append(f"AI Player {current_player.id + 1} placed a token.")
-                        break  # Don’t mark moved = True yet, we want to move this token
-
-            # Step 3: Move placed token (or best token) with remaining steps
-            if has_tokens_on_board and remaining_steps > 0:
-                token_to_move = just_placed_token or evaluate_token_moves(current_player, board, players, remaining_steps)
-                if token_to_move:
-                    old_pos = token_to_move.position
-                    new_pos = (old_pos + remaining_steps) % board.total_outer_tiles
-
-                    # Check for capture
-                    for other in players:
-                        if other.id != current_player.id:
-                            for t in other.tokens:
-                                if not t.in_home and t.position == new_pos:
-                                    if new_pos not in board.player_start_tiles.values():
-                                        t.in_home = True
-                                        t.position = None
-                                        current_player.score += 1
-                                        capture_occurred_this_turn = True
-                                        log_messages.append(f"AI Player {current_player.id + 1} captured Player {other.id + 1}'s token at {new_pos}!")
-
-                    token_to_move.position = new_pos
-                    moved = True
-                    remaining_steps = 0
-                    log_messages.append(f"AI Player {current_player.id + 1} ended move at {token_to_move.position}")
-
-                    if board.check_loop_completion(current_player.id, token_to_move, old_pos, new_pos):
-                        token_to_move.loops_completed += 1
-                        token_to_move.update_status()
-                        log_messages.append("Token completed a full loop!")
-
-                    if board.tiles[token_to_move.position].is_warp:
-                        old = token_to_move.position
-                        token_to_move.position = board.get_next_warp(old)
-                        log_messages.append(f"AI WARP! From {old} to {token_to_move.position}")
-
-            # End turn
-            if moved or (not can_move_from_home and not has_tokens_on_board):
-                if remaining_steps == 0:
-                    if capture_occurred_this_turn:
-                        rolled = False
-                        log_messages.append(f"AI Player {current_player.id + 1} gets an extra roll for capturing!")
-                        capture_occurred_this_turn = False
+                    if (state.rolled and state.current_player is current_player
+                            and selected_token is not None and not selected_token.in_home):
+                        possible_moves = get_possible_moves(state, selected_token)
+                        show_trail = True
                     else:
-                        rolled = False
-                        current_player_index = (current_player_index + 1) % len(players)
-                        turns_played += 1
-                        token_placed_this_turn = False
-                        pygame.time.delay(400)
-
-
-        pygame.display.flip()
-        clock.tick(30)
-
-    pygame.quit()
+                        selected_token = None
+                        possible_moves = []
+                        show_trail = False
+    finally:
+        if trace_path:
+            profiler.dump_trace(trace_path)
+        if recorder:
+            recorder.finish()
+            record_file.close()
+        if net:
+            net.close()
+        ai.close()
+        pygame.quit()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play Ludo: Capture Edition")
+    parser.add_argument("--seed", type=int, help="seed for the dice and warp zones, random by default")
+    parser.add_argument("--trace", help="save a Chrome trace of the last frames here on exit")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="join an online match on a server.py server")
+    parser.add_argument("--players", type=int, default=2, help="players in the online match")
+    parser.add_argument("--record", metavar="PATH", default=RECORD_PATH,
+                        help=f"append local games to this record file (default {RECORD_PATH}), empty to not record")
+    args = parser.parse_args()
+
+    connect = None
+    if args.connect:
+        host, _, port = args.connect.rpartition(":")
+        connect = (host or "127.0.0.1", int(port), args.players)
     screen = init_game()
-    game_loop(screen)
+    game_loop(screen, args.seed, args.trace, connect, args.record)
 
@@ -1,10 +1,12 @@
 # player.py
 
 import random
-import pygame
 from config import PLAYER_COLORS, TILE_SIZE
 
 class Token:
+    __slots__ = ("player_id", "token_id", "position", "in_home", "captures", "tokens_finished",
+                 "loops_completed", "ready_for_straight", "ready_for_final", "steps_moved")
+
     def __init__(self, player_id, token_id, position=None):
         self.player_id = player_id
         self.token_id = token_id
@@ -17,21 +19,38 @@ class Token:
         self.ready_for_final = False     
         self.steps_moved = 0
 
+    def clone(self):
+        """Field-by-field copy, much cheaper than copy.copy for slotted objects"""
+        token = Token.__new__(Token)
+        token.player_id = self.player_id
+        token.token_id = self.token_id
+        token.position = self.position
+        token.in_home = self.in_home
+        token.captures = self.captures
+        token.tokens_finished = self.tokens_finished
+        token.loops_completed = self.loops_completed
+        token.ready_for_straight = self.ready_for_straight
+        token.ready_for_final = self.ready_for_final
+        token.steps_moved = self.steps_moved
+        return token
+
+    def center(self, tile):
+        """Pixel center of the token on a tile, each token in its own quarter"""
+        offset = TILE_SIZE // 4
+        offsets = [
+            (-offset, -offset),
+            (offset, -offset),
+            (-offset, offset),
+            (offset, offset)
+        ]
+        dx, dy = offsets[self.token_id % 4]
+        return tile.x + TILE_SIZE // 2 + dx, tile.y + TILE_SIZE // 2 + dy
 
     def draw(self, screen, tile, color):
+        import pygame
         if tile:
-            offset = TILE_SIZE // 4
-            offsets = [
-                (-offset, -offset),
-                (offset, -offset),
-                (-offset, offset),
-                (offset, offset)
-            ]
-            dx, dy = offsets[self.token_id % 4]
-            center_x = tile.x + TILE_SIZE // 2 + dx
-            center_y = tile.y + TILE_SIZE // 2 + dy
             radius = TILE_SIZE // 5
-            pygame.draw.circle(screen, color, (center_x, center_y), radius)
+            pygame.draw.circle(screen, color, self.center(tile), radius)
 
     def update_status(self):
         """Update token's path access flags"""
@@ -40,6 +59,8 @@ class Token:
 
 
 class Player:
+    __slots__ = ("id", "is_ai", "color", "tokens", "base_positions", "captures", "score")
+
     def __init__(self, player_id, is_ai=False, color=(0, 0, 0)):
         self.id = player_id
         self.is_ai = is_ai
@@ -49,12 +70,24 @@ class Player:
         self.captures = 0
         self.score = 0
 
+    def clone(self):
+        """Copy with cloned tokens; base_positions is shared since only the UI sets it"""
+        player = Player.__new__(Player)
+        player.id = self.id
+        player.is_ai = self.is_ai
+        player.color = self.color
+        player.tokens = [token.clone() for token in self.tokens]
+        player.base_positions = self.base_positions
+        player.captures = self.captures
+        player.score = self.score
+        return player
+
     def get_valid_moves(self, board, dice_roll):
         """Get all valid moves considering new rules"""
         valid_moves = []
         for token in self.tokens:
             if not token.in_home:
-                new_pos = (token.position + dice_roll) % board.total_outer_tiles
+                new_pos = board.destinations[token.position][dice_roll]
                 if board.is_valid_move(self.id, token, new_pos):
                     valid_moves.append((token, new_pos))
         return valid_moves
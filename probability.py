@@ -0,0 +1,118 @@
+# probability.py
+
+from collections import OrderedDict
+
+from config import DICE_PER_TURN
+
+MAX_STEPS = DICE_PER_TURN * 6  # Furthest a token can get in one roll
+ENTRY_STEPS = MAX_STEPS - 6    # Furthest a token brought in on a six can get
+
+# The 21 distinct two-dice outcomes with their probabilities out of 36 rolls
+DICE_OUTCOMES = [((a, b), (1 if a == b else 2) / 36)
+                 for a in range(1, 7) for b in range(a, 7)]
+
+
+def _table(hit, *sizes):
+    """Probability, over one roll, of hit(die1, die2, *index) for every index in range(sizes)"""
+    if not sizes:
+        return sum(hit(a, b) for a in range(1, 7) for b in range(1, 7)) / 36
+    return [_table(lambda a, b, *rest: hit(a, b, i, *rest), *sizes[1:]) for i in range(sizes[0])]
+
+
+# TOTAL_PROBABILITY[t]: the dice add up to exactly t
+TOTAL_PROBABILITY = _table(lambda a, b, t: a + b == t, MAX_STEPS + 1)
+
+# REACH_PROBABILITY[k]: a board token can land k tiles ahead this roll. Steps
+# may be split across moves, so any offset up to the dice total is reachable.
+REACH_PROBABILITY = _table(lambda a, b, k: a + b >= k, MAX_STEPS + 2)
+
+# ENTRY_PROBABILITY[k]: a home token can be brought in on a six and land k
+# tiles past its start tile with the steps left over
+ENTRY_PROBABILITY = _table(lambda a, b, k: 6 in (a, b) and a + b - 6 >= k, ENTRY_STEPS + 2)
+
+# THREAT_PROBABILITY[d][k]: one roll lets an enemy land on a tile that its
+# nearest board token is d steps from, or that is k steps from its start
+# with a token at home. d = MAX_STEPS + 1 and k = ENTRY_STEPS + 1 mean "none".
+THREAT_PROBABILITY = _table(lambda a, b, d, k: a + b >= d or (6 in (a, b) and a + b - 6 >= k),
+                            MAX_STEPS + 2, ENTRY_STEPS + 2)
+
+# Landing tables of the most recently used boards and warp zones, at most
+# MAX_LANDING_TABLES of them. A table only depends on the move table and the
+# warps, so board copies (BackgroundAI makes one per decision) share it.
+MAX_LANDING_TABLES = 256
+_landing_tables = OrderedDict()
+
+
+def _landing_steps(board, warp_indices):
+    """landing[dst][src]: fewest steps a token on outer tile src needs to land on dst,
+    or MAX_STEPS + 1. Split moves can chain warps: land on one, jump, and go on from there."""
+    total = board.total_outer_tiles
+    warps = set(warp_indices)
+    landing = [[MAX_STEPS + 1] * total for _ in range(total)]
+    for src in range(total):
+        # standing[c]: tiles the token can stand on after spending c steps
+        standing = [set() for _ in range(MAX_STEPS + 1)]
+        standing[0].add(src)
+        for spent in range(MAX_STEPS):
+            for pos in standing[spent]:
+                for steps in range(1, MAX_STEPS - spent + 1):
+                    dst = board.destinations[pos][steps]
+                    cost = spent + steps
+                    if cost < landing[dst][src]:
+                        landing[dst][src] = cost
+                    if dst in warps and cost < MAX_STEPS:
+                        standing[cost].add(board.get_next_warp(dst))
+    return landing
+
+
+def landing_steps(board):
+    """Fewest-steps table of _landing_steps for the board's current warp zones"""
+    warp_indices = tuple(sorted(board.warp_indices))
+    # The entry keeps the move table alive, so its id isn't reused while cached
+    key = (id(board.destinations), warp_indices)
+    entry = _landing_tables.get(key)
+    if entry is not None:
+        _landing_tables.move_to_end(key)
+        return entry[1]
+    if len(_landing_tables) >= MAX_LANDING_TABLES:
+        _landing_tables.popitem(last=False)
+    landing = _landing_steps(board, warp_indices)
+    _landing_tables[key] = (board.destinations, landing)
+    return landing
+
+
+def threat_probability(state, player_id, tile):
+    """Chance that at least one enemy can land on tile with its next roll"""
+    if tile in state.board.safe_tiles:
+        return 0.0
+    return _threat(state, player_id, landing_steps(state.board)[tile])
+
+
+def token_threats(state, player_id):
+    """threat_probability of each of the player's tokens, 0 for tokens at home"""
+    board = state.board
+    landing = landing_steps(board)
+    return [0.0 if t.in_home or t.position in board.safe_tiles else _threat(state, player_id, landing[t.position])
+            for t in state.players[player_id].tokens]
+
+
+def _threat(state, player_id, to_tile):
+    """threat_probability given the tile's row of the landing table"""
+    start_tiles = state.board.player_start_tiles
+    safe = 1.0
+    for player in state.players:
+        if player.id == player_id:
+            continue
+        nearest = MAX_STEPS + 1
+        entry = ENTRY_STEPS + 1
+        for token in player.tokens:
+            if token.in_home:
+                steps = to_tile[start_tiles[player.id]]
+                if steps < entry:
+                    entry = steps
+            else:
+                steps = to_tile[token.position]
+                if steps < nearest:
+                    nearest = steps
+        safe *= 1 - THREAT_PROBABILITY[nearest][entry]
+    return 1 - safe
@@ -0,0 +1,77 @@
+# profiler.py
+
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+
+class FrameProfiler:
+    """Named timers around the phases of a frame.
+
+    Keeps per-phase milliseconds for the last history frames, for the
+    on-screen overlay, and a rolling trace of the last trace_events phases
+    that dump_trace writes in Chrome's trace event format (open it in
+    chrome://tracing or Perfetto). Phases can nest.
+    """
+
+    def __init__(self, history=60, trace_events=20000, enabled=True):
+        self.enabled = enabled
+        self.frames = deque(maxlen=history)     # (frame start, {phase: seconds})
+        self.trace = deque(maxlen=trace_events)  # (name, start, duration)
+        self.current = {}
+        self.frame_start = time.perf_counter()
+        self.epoch = self.frame_start
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.current[name] = self.current.get(name, 0.0) + duration
+            self.trace.append((name, start, duration))
+
+    def phase(self, name):
+        """Context manager timing one phase of the current frame"""
+        return self._timed(name) if self.enabled else nullcontext()
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.trace.append(("frame", self.frame_start, now - self.frame_start))
+        self.frames.append((self.frame_start, self.current))
+        self.current = {}
+        self.frame_start = now
+
+    @property
+    def fps(self):
+        if len(self.frames) < 2:
+            return 0.0
+        return (len(self.frames) - 1) / (self.frames[-1][0] - self.frames[0][0])
+
+    def averages(self):
+        """Average milliseconds per frame of each phase over the recent frames"""
+        totals = {}
+        for _, phases in self.frames:
+            for name, seconds in phases.items():
+                totals[name] = totals.get(name, 0.0) + seconds
+        count = max(len(self.frames), 1)
+        return {name: seconds * 1000 / count for name, seconds in totals.items()}
+
+    def overlay_lines(self):
+        lines = [f"FPS {self.fps:.1f}"]
+        lines += [f"{name} {ms:.2f} ms" for name, ms in sorted(self.averages().items())]
+        return lines
+
+    def dump_trace(self, path):
+        """Write the rolling trace as Chrome trace JSON"""
+        pid = os.getpid()
+        events = [{"name": name, "ph": "X", "pid": pid, "tid": 0,
+                   "ts": (start - self.epoch) * 1e6, "dur": duration * 1e6}
+                  for name, start, duration in self.trace]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,102 @@
+# protocol.py
+
+import struct
+
+from engine import ROLL, NONE_BYTE
+from record import HEADER, MAGIC, VERSION, encode_op, decode_op
+
+# Every message is a u16 length followed by that many bytes: a type byte
+# and its payload. Actions use the one-byte encoding of record.py; the
+# server answers with GameState diffs, so clients never run the rules and
+# one that (re)joins late only needs the last keyframe and the diffs since.
+#
+#   client -> server
+#   HELLO     players in the wanted match
+#   ACTION    record byte of the action; the dice of a roll are ignored
+#   RESUME    match id (u32), seat, rejoin key (u32) - take a seat back after losing the connection
+#   WATCH     match id (u32) - follow a match as a spectator
+#   server -> client
+#   WELCOME   match id (u32), seat or NONE_BYTE for spectators, rejoin key (u32), count
+#             of DIFFs after the next KEYFRAME that catch up with the match (u16),
+#             then a record header (seed 0) giving the players
+#   KEYFRAME  GameState.keyframe(), sent after WELCOME and every KEYFRAME_INTERVAL actions
+#   DIFF      GameState.diff() of one applied action
+#   END       winner seat, NONE_BYTE when the match hit the turn limit or was abandoned
+#   ERROR     UTF-8 reason a message was refused
+LENGTH = struct.Struct("<H")
+HELLO = 1
+ACTION = 2
+WELCOME = 3
+DIFF = 4
+END = 5
+ERROR = 6
+KEYFRAME = 7
+RESUME = 8
+WATCH = 9
+WELCOME_STRUCT = struct.Struct("<IBIH")
+RESUME_STRUCT = struct.Struct("<IBI")
+WATCH_STRUCT = struct.Struct("<I")
+
+KEYFRAME_INTERVAL = 64
+
+MIN_PLAYERS = 2
+MAX_PLAYERS = 5
+
+
+def message(kind, payload=b""):
+    """A framed message, ready to write to a stream"""
+    return LENGTH.pack(len(payload) + 1) + bytes([kind]) + payload
+
+
+async def read_message(reader):
+    """The next (type, payload) from an asyncio stream; raises IncompleteReadError at EOF"""
+    length, = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    body = await reader.readexactly(length)
+    return body[0], body[1:]
+
+
+def hello(num_players):
+    return message(HELLO, bytes([num_players]))
+
+
+def action_message(action):
+    return message(ACTION, bytes([encode_op(action[:1] if action[0] == ROLL else action)]))
+
+
+def parse_action(payload):
+    """The action a client asked for"""
+    if len(payload) != 1:
+        raise ValueError("An action is one byte")
+    action = decode_op(payload[0])
+    return (ROLL,) if action[0] == ROLL else action
+
+
+def resume(match_id, seat, key):
+    return message(RESUME, RESUME_STRUCT.pack(match_id, seat, key))
+
+
+def watch(match_id):
+    return message(WATCH, WATCH_STRUCT.pack(match_id))
+
+
+def welcome(match_id, seat, key, catch_up, state):
+    ai_mask = sum(1 << p.id for p in state.players if p.is_ai)
+    header = HEADER.pack(MAGIC, VERSION, len(state.players), ai_mask, 0, *state.board.warp_indices)
+    return message(WELCOME, WELCOME_STRUCT.pack(match_id, seat, key, catch_up) + header)
+
+
+def parse_welcome(payload):
+    """(match id, seat, rejoin key, catch-up DIFFs, AI flags, warp tiles) of a WELCOME"""
+    match_id, seat, key, catch_up = WELCOME_STRUCT.unpack_from(payload)
+    magic, version, num_players, ai_mask, _, *warps = HEADER.unpack_from(payload, WELCOME_STRUCT.size)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a version {VERSION} start position")
+    return match_id, seat, key, catch_up, [bool(ai_mask >> i & 1) for i in range(num_players)], warps
+
+
+def end(winner_seat=None):
+    return message(END, bytes([NONE_BYTE if winner_seat is None else winner_seat]))
+
+
+def error(reason):
+    return message(ERROR, reason.encode())
@@ -0,0 +1,208 @@
+# record.py
+
+import argparse
+import struct
+
+from board import Board
+from engine import GameState, create_players, ROLL, PLACE, MOVE
+
+# A record file is a sequence of games, each a header followed by one byte per
+# action and ended by END. Games are only ever appended.
+#
+#   header  magic "LG", version, players, AI seat bitmask, seed (u64), 4 warp tiles
+#   0x00-0x23  roll: (die1 - 1) * 6 + (die2 - 1)
+#   0x40-0x43  place: token_id
+#   0x80-0xBC  move: token_id << 4 | steps
+#   0xC0       warp refresh, followed by the 4 new warp tiles
+#   0xFF       end of game
+MAGIC = b"LG"
+VERSION = 1
+HEADER = struct.Struct("<2sBBBQ4B")
+PLACE_OP = 0x40
+MOVE_OP = 0x80
+WARP_OP = 0xC0
+END = 0xFF
+
+
+class GameRecorder:
+    """Writes games in the record format to a binary file object"""
+
+    def __init__(self, out):
+        self.out = out
+
+    def start(self, state, seed=0):
+        ai_mask = sum(1 << p.id for p in state.players if p.is_ai)
+        self.out.write(HEADER.pack(MAGIC, VERSION, len(state.players), ai_mask, seed,
+                                   *state.board.warp_indices))
+
+    def record(self, action, events):
+        """Append an action GameState.step applied, with the events it returned"""
+        self.out.write(encode_step(action, events))
+
+    def finish(self):
+        self.out.write(bytes([END]))
+
+
+def encode_step(action, events):
+    """The record bytes of an applied action and of any warp refresh it caused"""
+    if action[0] == ROLL:
+        action = (ROLL,) + events[0][2:4]
+    data = bytearray([encode_op(action)])
+    for event in events:
+        if event[0] == "warp_refresh":
+            data.append(WARP_OP)
+            data.extend(event[1])
+    return bytes(data)
+
+
+def encode_op(action):
+    """The record byte of an action; a roll without dice values counts as 1 + 1"""
+    kind = action[0]
+    if kind == ROLL:
+        die1, die2 = action[1:3] or (1, 1)
+        return (die1 - 1) * 6 + die2 - 1
+    if kind == PLACE:
+        return PLACE_OP | action[1]
+    if kind == MOVE:
+        return MOVE_OP | action[1] << 4 | action[2]
+    raise ValueError(f"Unknown action: {action!r}")
+
+
+def decode_op(op):
+    """The action of a record byte, with the dice of a roll"""
+    if op < PLACE_OP:
+        return (ROLL, op // 6 + 1, op % 6 + 1)
+    if op < MOVE_OP:
+        return (PLACE, op & 0x0F)
+    return (MOVE, op >> 4 & 0x03, op & 0x0F)
+
+
+class RecordedGame:
+    __slots__ = ("seed", "ai_flags", "warp_indices", "moves")
+
+    def __init__(self, seed, ai_flags, warp_indices, moves):
+        self.seed = seed
+        self.ai_flags = ai_flags
+        self.warp_indices = warp_indices
+        self.moves = moves
+
+
+def read_games(data):
+    """Yield every complete game in a record, given as bytes or an mmap.
+
+    Games cut off before their END byte are skipped.
+    """
+    pos = 0
+    while pos + HEADER.size <= len(data):
+        magic, version, num_players, ai_mask, seed, *warps = HEADER.unpack_from(data, pos)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} game record at byte {pos}")
+        start = pos + HEADER.size
+        # No action or warp tile byte is ever END, so the game runs up to the first one
+        end = data.find(bytes([END]), start)
+        # Nor do two of them ever spell MAGIC ("L" is no op and no tile of the
+        # standard board), so one found first starts the next game: this one
+        # was cut off while being written
+        restart = data.find(MAGIC, start, end if end >= 0 else len(data))
+        if restart >= 0:
+            pos = restart
+            continue
+        if end < 0:
+            return
+        ai_flags = [bool(ai_mask >> seat & 1) for seat in range(num_players)]
+        yield RecordedGame(seed, ai_flags, warps, bytes(data[start:end]))
+        pos = end + 1
+
+
+def start_state(game, board=None):
+    """The position a recorded game starts from"""
+    board = board if board is not None else Board()
+    board.set_warp_zones(game.warp_indices)
+    state = GameState(create_players(game.ai_flags), board)
+    # Warp refreshes come from the record, not the random generator
+    state.freeze_warps = True
+    return state
+
+
+def replay_steps(state, game, turn=None):
+    """Play a recorded game forward from start_state, yielding the events of each step.
+
+    Stops at the start of the given turn, or at the end of the record.
+    """
+    return play_ops(state, game.moves, turn)
+
+
+def play_ops(state, moves, turn=None):
+    """Apply record bytes to a state with frozen warps, yielding the events of each step"""
+    pos = 0
+    while pos < len(moves):
+        op = moves[pos]
+        if op == WARP_OP:
+            warp_indices = tuple(moves[pos + 1:pos + 5])
+            state.set_warp_zones(warp_indices)
+            pos += 5
+            yield [("warp_refresh", warp_indices)]
+            continue
+        if turn is not None and state.turns_played >= turn:
+            return
+        yield state.step(decode_op(op))
+        pos += 1
+
+
+def replay(game, turn=None, board=None):
+    """Fast-forward a recorded game through the rules, without rendering"""
+    state = start_state(game, board)
+    for _ in replay_steps(state, game, turn):
+        pass
+    return state
+
+
+def describe_state(state):
+    lines = [f"Turn {state.turns_played}, Player {state.current_player.id + 1} to "
+             + ("move" if state.rolled else "roll")
+             + (f" ({state.remaining_steps} steps left)" if state.rolled else "")]
+    for player in state.players:
+        tokens = ", ".join("home" if t.in_home else str(t.position) for t in player.tokens)
+        lines.append(f"Player {player.id + 1}{' (AI)' if player.is_ai else ''}: "
+                     f"score {player.score}, tokens {tokens}")
+    lines.append(f"Warp zones: {sorted(state.board.warp_indices)}")
+    if state.winner is not None:
+        lines.append(f"Player {state.winner.id + 1} won")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded games without rendering")
+    parser.add_argument("path")
+    parser.add_argument("--game", type=int, help="show one game, counting from 0")
+    parser.add_argument("--turn", type=int, help="stop that game at the start of this turn")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        data = f.read()
+
+    board = Board()
+    if args.game is not None:
+        for number, game in enumerate(read_games(data)):
+            if number == args.game:
+                print(f"Game {number}, seed {game.seed}")
+                print(describe_state(replay(game, args.turn, board)))
+                return
+        parser.error(f"the record has no game {args.game}")
+
+    games = 0
+    turns = 0
+    wins = {}
+    for game in read_games(data):
+        state = replay(game, board=board)
+        games += 1
+        turns += state.turns_played
+        if state.winner is not None:
+            wins[state.winner.id] = wins.get(state.winner.id, 0) + 1
+    print(f"{games} games, {len(data)} bytes, average turns per game: {turns / max(games, 1):.2f}")
+    for seat in sorted(wins):
+        print(f"Seat {seat + 1}: {wins[seat]} wins")
+
+
+if __name__ == "__main__":
+    main()
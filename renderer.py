@@ -0,0 +1,149 @@
+# renderer.py
+
+from collections import OrderedDict
+
+import pygame
+from config import BACKGROUND_COLOR
+from profiler import FrameProfiler
+
+# Font sizes the HUD uses, by name
+FONT_SIZES = {"small": 24, "large": 36, "banner": 72}
+
+
+class Sprite:
+    """Something drawn over the board for one frame.
+
+    key describes everything about how it looks, so two frames with the same
+    key draw the same pixels inside rect; draw(screen) paints it.
+    """
+
+    __slots__ = ("key", "rect", "draw")
+
+    def __init__(self, key, rect, draw):
+        self.key = key
+        self.rect = rect
+        self.draw = draw
+
+
+def circle_sprite(key, color, center, radius):
+    rect = pygame.Rect(center[0] - radius, center[1] - radius, 2 * radius + 1, 2 * radius + 1)
+    return Sprite(key, rect, lambda screen: pygame.draw.circle(screen, color, center, radius))
+
+
+def text_sprite(key, surface, pos):
+    rect = surface.get_rect(topleft=pos)
+    return Sprite(key, rect, lambda screen: screen.blit(surface, pos))
+
+
+class TextCache:
+    """Fonts loaded once plus a bounded cache of rendered text surfaces.
+
+    Surfaces are keyed on (text, font name, color); when more than
+    max_entries are cached the least recently used one is dropped.
+    """
+
+    def __init__(self, max_entries=256):
+        self.fonts = {name: pygame.font.SysFont(None, size) for name, size in FONT_SIZES.items()}
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.surfaces)
+
+    def render(self, text, font="small", color=(0, 0, 0)):
+        key = (text, font, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+
+        self.misses += 1
+        surface = self.fonts[font].render(text, True, color)
+        if len(self.surfaces) >= self.max_entries:
+            self.surfaces.popitem(last=False)
+        self.surfaces[key] = surface
+        return surface
+
+
+class Renderer:
+    """Draws frames by repainting only what changed since the last one.
+
+    The board is drawn once onto a cached background surface; tiles the
+    board reports as changed are repainted on it in place. Each frame is a
+    list of sprites; sprites that appeared, disappeared or changed, plus
+    changed tiles, give the dirty rectangles. Only those are repainted and
+    passed to pygame.display.update, and an unchanged frame costs nothing.
+    """
+
+    def __init__(self, screen, board, profiler=None):
+        self.screen = screen
+        self.board = board
+        self.profiler = profiler if profiler is not None else FrameProfiler(enabled=False)
+        self.background = pygame.Surface(screen.get_size())
+        self.background_ready = False
+        self.scratch = pygame.Surface(screen.get_size())
+        self.sprites = {}
+        self.full_redraw = True
+
+    def invalidate(self):
+        """Repaint the whole window on the next frame"""
+        self.full_redraw = True
+
+    def _update_background(self):
+        """Repaint changed tiles on the cached board, returning their rects"""
+        changed = self.board.take_changed_tiles()
+        if not self.background_ready:
+            self.background.fill(BACKGROUND_COLOR)
+            self.board.draw(self.background)
+            self.background_ready = True
+            return []
+
+        tiles = self.board.tiles
+        rects = [tiles[idx].rect for idx in changed]
+        for rect in rects:
+            # Neighbouring tiles may overlap the rect, so all of them are drawn
+            # in board order. pygame outlines clipped rects along the clip
+            # edge, so they go unclipped onto a scratch surface and only the
+            # rect is copied over.
+            self.scratch.fill(BACKGROUND_COLOR, rect)
+            for tile in tiles:
+                if tile.rect.colliderect(rect):
+                    tile.draw(self.scratch, goal_index=self.board.goal_tile_index)
+            self.background.blit(self.scratch, rect, rect)
+        return rects
+
+    def render(self, sprites):
+        """Show a frame made of the board plus sprites, painted in order"""
+        with self.profiler.phase("board"):
+            changed_tiles = self._update_background()
+        frame = {sprite.key: sprite for sprite in sprites}
+
+        if self.full_redraw:
+            with self.profiler.phase("draw"):
+                self.screen.blit(self.background, (0, 0))
+                for sprite in sprites:
+                    sprite.draw(self.screen)
+                pygame.display.flip()
+            self.sprites = frame
+            self.full_redraw = False
+            return
+
+        dirty = changed_tiles
+        dirty += [s.rect for key, s in self.sprites.items() if key not in frame]
+        dirty += [s.rect for key, s in frame.items() if key not in self.sprites]
+        self.sprites = frame
+        if not dirty:
+            return
+
+        with self.profiler.phase("draw"):
+            for rect in dirty:
+                self.screen.set_clip(rect)
+                self.screen.blit(self.background, rect, rect)
+                for sprite in sprites:
+                    if sprite.rect.colliderect(rect):
+                        sprite.draw(self.screen)
+            self.screen.set_clip(None)
+            pygame.display.update(dirty)
@@ -0,0 +1,208 @@
+# search.py
+
+import argparse
+import time
+
+from board import Board
+from engine import seeded_game, ROLL, PLACE, MOVE
+from zobrist import TranspositionTable
+from probability import DICE_OUTCOMES, token_threats
+
+WIN_VALUE = 1000
+CAPTURE_RISK = 6  # Value lost by a token that is certain to be captured
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate_position(state):
+    """Heuristic value of the position for every seat, relative to the best opponent"""
+    raw = []
+    for player in state.players:
+        if state.winner is player:
+            raw.append(WIN_VALUE)
+            continue
+        value = 10 * player.score
+        for token, threat in zip(player.tokens, token_threats(state, player.id)):
+            if not token.in_home:
+                value += 2 - CAPTURE_RISK * threat
+        raw.append(value)
+
+    values = []
+    for i, value in enumerate(raw):
+        best_other = max(v for j, v in enumerate(raw) if j != i)
+        values.append(value - best_other)
+    return values
+
+
+class ExpectimaxAI:
+    """Expectimax AI over dice chance nodes, usable as a policy.
+
+    Each seat picks the action that maximizes its own value at its choice
+    nodes; chance nodes average over all dice outcomes. Search deepens one
+    roll at a time until max_depth or until budget_ms runs out, then plays
+    the best action of the deepest finished search. Warp zones stay as they
+    are inside the search. Results are cached by position hash in a
+    transposition table of at most table_size entries, kept across moves.
+    """
+
+    def __init__(self, budget_ms=None, max_depth=2, table_size=100000):
+        self.budget_ms = budget_ms
+        self.max_depth = max_depth
+        self.table = TranspositionTable(table_size)
+        self.deadline = None
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.depth_reached = 0
+        self.total_nodes = 0
+        self.total_elapsed = 0.0
+
+    @property
+    def nodes_per_second(self):
+        return self.total_nodes / self.total_elapsed if self.total_elapsed else 0.0
+
+    def __call__(self, state):
+        if not state.rolled:
+            return (ROLL,)
+
+        actions = self._candidate_actions(state)
+        if len(actions) == 1:
+            self.depth_reached = 0
+            return actions[0]
+
+        start = time.perf_counter()
+        self.deadline = start + self.budget_ms / 1000 if self.budget_ms is not None else None
+        self.nodes = 0
+        best_action = actions[0]
+        self.depth_reached = -1
+        # Search steps one private copy forward and undoes with snapshots
+        root = state.copy()
+        try:
+            for depth in range(self.max_depth + 1):
+                best_action = self._best_action(root, actions, depth)
+                self.depth_reached = depth
+        except SearchTimeout:
+            pass
+
+        self.elapsed = time.perf_counter() - start
+        self.total_nodes += self.nodes
+        self.total_elapsed += self.elapsed
+        return best_action
+
+    def _best_action(self, state, actions, depth):
+        seat = state.current_player_index
+        snapshot = state.snapshot()
+        best_action, best_value = None, None
+        for action in actions:
+            state.step(action)
+            value = self._value(state, depth)[seat]
+            state.restore(snapshot)
+            if best_value is None or value > best_value:
+                best_action, best_value = action, value
+        return best_action
+
+    def _value(self, state, depth):
+        """Value vector of a position; depth counts the dice rolls still to look at"""
+        self.nodes += 1
+        if self.deadline is not None and self.nodes % 64 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        if state.game_over or (not state.rolled and depth == 0):
+            return evaluate_position(state)
+
+        key = state.hash_key()
+        cached = self.table.get(key, depth)
+        if cached is not None:
+            return cached
+
+        snapshot = state.snapshot()
+        if not state.rolled:
+            # Chance node: average over every dice outcome
+            best = [0.0] * len(state.players)
+            for dice, probability in DICE_OUTCOMES:
+                state.step((ROLL,) + dice)
+                values = self._value(state, depth - 1)
+                state.restore(snapshot)
+                for i, value in enumerate(values):
+                    best[i] += probability * value
+        else:
+            # Choice node: the current player takes its best action
+            seat = state.current_player_index
+            best = None
+            for action in self._candidate_actions(state):
+                state.step(action)
+                values = self._value(state, depth)
+                state.restore(snapshot)
+                if best is None or values[seat] > best[seat]:
+                    best = values
+
+        self.table.store(key, depth, best)
+        return best
+
+    def _candidate_actions(self, state):
+        """Legal actions worth searching: tokens on the same tile or at home are interchangeable,
+        and splitting a roll only matters when the first part lands on a capture or a warp."""
+        player = state.current_player
+        board = state.board
+        steps = state.remaining_steps
+        actions = []
+
+        if state.can_place():
+            home_token = next(t for t in player.tokens if t.in_home)
+            actions.append((PLACE, home_token.token_id))
+
+        seen = set()
+        for token in player.tokens:
+            if token.in_home or token.position in seen:
+                continue
+            seen.add(token.position)
+            for step in range(1, steps):
+                target = board.destinations[token.position][step]
+                if board.tiles[target].is_warp or (
+                        target not in board.safe_tiles and state.enemies_at(player.id, target)):
+                    actions.append((MOVE, token.token_id, step))
+            actions.append((MOVE, token.token_id, steps))
+
+        return actions or state.legal_actions()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play the expectimax AI against the greedy AI and report search speed")
+    parser.add_argument("--games", type=int, default=10)
+    parser.add_argument("--players", type=int, default=2)
+    parser.add_argument("--budget-ms", type=float, default=100)
+    parser.add_argument("--max-depth", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from ai import greedy_policy  # ai registers this module's AI, so import it late
+
+    searcher = ExpectimaxAI(args.budget_ms, args.max_depth)
+    board = Board()
+    wins = 0
+    decisions = 0
+    depths = 0
+    for game in range(args.games):
+        state = seeded_game([True] * args.players, args.seed + game, board)
+        while not state.game_over:
+            if state.current_player_index == 0:
+                action = searcher(state)
+                if action[0] != ROLL:
+                    decisions += 1
+                    depths += max(searcher.depth_reached, 0)
+            else:
+                action = greedy_policy(state)
+            state.step(action)
+        wins += state.winner.id == 0
+
+    print(f"Expectimax won {wins}/{args.games} games against {args.players - 1} greedy AI(s)")
+    print(f"{searcher.nodes_per_second:.0f} nodes/s, average depth {depths / max(decisions, 1):.2f} rolls "
+          f"with a {args.budget_ms:g} ms budget")
+    table = searcher.table
+    print(f"Transposition table: {len(table)} entries, "
+          f"{table.hits / max(table.hits + table.misses, 1):.1%} hit rate")
+
+
+if __name__ == "__main__":
+    main()
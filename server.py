@@ -0,0 +1,304 @@
+# server.py
+
+import argparse
+import asyncio
+import io
+import random
+import secrets
+import time
+
+import protocol
+from engine import seeded_game
+from record import GameRecorder
+
+
+class Match:
+    """One game on the headless rules, between the connections in its seats.
+
+    Every applied action goes to all seats and spectators as a DIFF, with a
+    KEYFRAME every KEYFRAME_INTERVAL actions. Anyone joining late gets the
+    last keyframe and the diffs since, so catching up costs at most
+    KEYFRAME_INTERVAL small messages however long the match has run.
+    A connection that lets more than MAX_BUFFERED bytes pile up unread is
+    dropped instead of buffered without limit; it can RESUME or WATCH
+    again and catch up the same way.
+    """
+
+    MAX_BUFFERED = 256 * 1024
+
+    def __init__(self, match_id, writers, seed, max_turns=1000, record_file=None):
+        self.id = match_id
+        self.writers = [None] * len(writers)  # None while a seat's client is away
+        self.watchers = []
+        self.keys = [secrets.randbits(32) for _ in writers]
+        self.seed = seed
+        self.max_turns = max_turns
+        self.state = seeded_game([False] * len(writers), seed)
+        self.finished = False
+        self.keyframe = self.state.keyframe()
+        self.diffs = []
+        self.bytes_sent = 0
+        # Matches run side by side, so each is buffered and appended whole
+        self.record_file = record_file
+        self.recorder = GameRecorder(io.BytesIO()) if record_file else None
+        if self.recorder:
+            self.recorder.start(self.state, seed)
+        for seat, writer in enumerate(writers):
+            self.join(writer, seat)
+
+    def join(self, writer, seat=None):
+        """Seat a (re)connected client, or add a spectator with seat None, and catch it up"""
+        if seat is None:
+            welcome = protocol.welcome(self.id, protocol.NONE_BYTE, 0, len(self.diffs), self.state)
+            self.watchers.append(writer)
+        else:
+            welcome = protocol.welcome(self.id, seat, self.keys[seat], len(self.diffs), self.state)
+            self.writers[seat] = writer
+        self.send(writer, welcome + protocol.message(protocol.KEYFRAME, self.keyframe)
+                  + b"".join(protocol.message(protocol.DIFF, diff) for diff in self.diffs))
+
+    def act(self, seat, payload):
+        """Apply an ACTION from the client in seat; returns whether the match is over"""
+        state = self.state
+        if self.finished:
+            self.send(self.writers[seat], protocol.error("The match is over"))
+            return False
+        if seat != state.current_player_index:
+            self.send(self.writers[seat], protocol.error("Not your turn"))
+            return False
+        before = state.snapshot()
+        try:
+            action = protocol.parse_action(payload)
+            if action[1:] and action not in state.legal_actions():
+                raise ValueError(f"Illegal action: {action!r}")
+            events = state.step(action)
+        except ValueError as e:
+            self.send(self.writers[seat], protocol.error(str(e)))
+            return False
+
+        if self.recorder:
+            self.recorder.record(action, events)
+        diff = state.diff(before, events)
+        self.diffs.append(diff)
+        self.broadcast(protocol.message(protocol.DIFF, diff))
+        if len(self.diffs) >= protocol.KEYFRAME_INTERVAL:
+            self.keyframe = state.keyframe()
+            self.diffs = []
+            self.broadcast(protocol.message(protocol.KEYFRAME, self.keyframe))
+        if state.game_over or state.turns_played >= self.max_turns:
+            self.finish(state.winner.id if state.winner is not None else None)
+        return self.finished
+
+    def broadcast(self, data):
+        for writer in self.writers + self.watchers:
+            if writer is not None and not writer.is_closing():
+                self.send(writer, data)
+                self.bytes_sent += len(data)
+
+    def send(self, writer, data):
+        writer.write(data)
+        if writer.transport.get_write_buffer_size() > self.MAX_BUFFERED:
+            # Dropped with what it hasn't read; its handler sees EOF and leaves
+            writer.transport.abort()
+
+    def finish(self, winner_seat=None):
+        if self.finished:
+            return
+        self.finished = True
+        if self.recorder:
+            self.recorder.finish()
+            self.record_file.write(self.recorder.out.getvalue())
+            # On disk now, so a killed server keeps every match it finished
+            self.record_file.flush()
+        self.broadcast(protocol.end(winner_seat))
+
+
+class GameServer:
+    """Hosts any number of concurrent matches on one event loop.
+
+    Clients send HELLO with a player count and wait in the lobby for that
+    many; the match then starts with seats in the order they joined. A
+    client that disconnects can RESUME its seat with the key from its
+    WELCOME; if it isn't back within reconnect_seconds the match ends for
+    everyone. Anyone can WATCH a running match.
+    """
+
+    def __init__(self, seed=0, max_turns=1000, record_file=None, reconnect_seconds=30):
+        self.seeds = random.Random(seed)
+        self.max_turns = max_turns
+        self.record_file = record_file
+        self.reconnect_seconds = reconnect_seconds
+        self.lobby = {n: [] for n in range(protocol.MIN_PLAYERS, protocol.MAX_PLAYERS + 1)}
+        self.live = {}      # Match id -> match still being played
+        self.seats = {}     # Writer of each seated connection -> (match, seat)
+        self.watching = {}  # Writer of each spectator -> match
+        self.abandon_timers = {}  # (match id, seat) -> timer ending the match
+        self.next_id = 0
+        self.matches_started = 0
+        self.matches_finished = 0
+        self.actions = 0
+        self.bytes_sent = 0  # Broadcast by finished matches
+
+    async def handle_client(self, reader, writer):
+        reading = None  # A read started while waiting in the lobby
+        try:
+            kind, payload = await protocol.read_message(reader)
+            if kind == protocol.HELLO and len(payload) == 1 and payload[0] in self.lobby:
+                reading = asyncio.ensure_future(protocol.read_message(reader))
+                match, seat = await self.join(payload[0], writer, reading)
+            elif kind == protocol.RESUME:
+                match, seat = self.resume(payload, writer)
+            elif kind == protocol.WATCH:
+                match, seat = self.watch(payload, writer), None
+            else:
+                raise ValueError("Expected HELLO with 2 to 5 players, RESUME or WATCH")
+
+            while not match.finished:
+                kind, payload = await (reading or protocol.read_message(reader))
+                reading = None
+                if kind != protocol.ACTION or seat is None:
+                    match.send(writer, protocol.error("Only seated players send actions"))
+                    continue
+                self.actions += 1
+                if match.act(seat, payload):
+                    self.end(match)
+                # Stop reading a client's actions while it isn't reading our replies
+                await writer.drain()
+            await writer.drain()
+        except ValueError as e:
+            writer.write(protocol.error(str(e)))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if reading:
+                reading.cancel()
+            self.leave(writer)
+            writer.close()
+
+    async def join(self, num_players, writer, reading):
+        """Wait in the lobby until the match fills; returns (match, seat).
+
+        reading is the client's next message. Nothing comes before WELCOME
+        unless the client hung up, so if it finishes first the client leaves
+        the lobby and its error is raised.
+        """
+        future = asyncio.get_running_loop().create_future()
+        waiting = self.lobby[num_players]
+        # A connection that closed after its handler last looked is skipped
+        waiting[:] = [(w, f) for w, f in waiting if not w.is_closing()]
+        waiting.append((writer, future))
+        if len(waiting) == num_players:
+            self.lobby[num_players] = []
+            match = Match(self.next_id, [w for w, _ in waiting], self.seeds.getrandbits(64),
+                          self.max_turns, self.record_file)
+            self.live[match.id] = match
+            self.next_id += 1
+            self.matches_started += 1
+            for seat, (w, f) in enumerate(waiting):
+                self.seats[w] = (match, seat)
+                f.set_result((match, seat))
+        await asyncio.wait({future, reading}, return_when=asyncio.FIRST_COMPLETED)
+        if not future.done():
+            waiting = self.lobby[num_players]
+            waiting[:] = [(w, f) for w, f in waiting if w is not writer]
+            future.cancel()
+            reading.result()
+            raise ValueError("Wait for WELCOME before sending actions")
+        return future.result()
+
+    def resume(self, payload, writer):
+        if len(payload) != protocol.RESUME_STRUCT.size:
+            raise ValueError("RESUME is a match id, seat and key")
+        match_id, seat, key = protocol.RESUME_STRUCT.unpack(payload)
+        match = self.live.get(match_id)
+        if match is None or seat >= len(match.keys) or key != match.keys[seat]:
+            raise ValueError("No such seat to resume")
+        old = match.writers[seat]
+        if old is not None:
+            # The old connection may only look alive; the seat follows the key
+            self.seats.pop(old, None)
+            old.close()
+        timer = self.abandon_timers.pop((match_id, seat), None)
+        if timer:
+            timer.cancel()
+        match.join(writer, seat)
+        self.seats[writer] = (match, seat)
+        return match, seat
+
+    def watch(self, payload, writer):
+        if len(payload) != protocol.WATCH_STRUCT.size:
+            raise ValueError("WATCH is a match id")
+        match_id, = protocol.WATCH_STRUCT.unpack(payload)
+        match = self.live.get(match_id)
+        if match is None:
+            raise ValueError(f"No running match {match_id}")
+        match.join(writer)
+        self.watching[writer] = match
+        return match
+
+    def leave(self, writer):
+        """Drop a closed connection from the lobby or its match; a seat is held for a while"""
+        for waiting in self.lobby.values():
+            waiting[:] = [(w, f) for w, f in waiting if w is not writer]
+        match = self.watching.pop(writer, None)
+        if match is not None:
+            match.watchers.remove(writer)
+        match, seat = self.seats.pop(writer, (None, None))
+        if match is not None and not match.finished:
+            match.writers[seat] = None
+            self.abandon_timers[match.id, seat] = asyncio.get_running_loop().call_later(
+                self.reconnect_seconds, self.abandon, match)
+
+    def abandon(self, match):
+        if not match.finished:
+            match.finish()
+            self.end(match)
+
+    def end(self, match):
+        """Count a finished match once, however many paths reach its end"""
+        if self.live.pop(match.id, None) is None:
+            return
+        self.matches_finished += 1
+        self.bytes_sent += match.bytes_sent
+        for seat in range(len(match.writers)):
+            timer = self.abandon_timers.pop((match.id, seat), None)
+            if timer:
+                timer.cancel()
+
+
+async def serve(host, port, server, report_seconds=10):
+    listener = await asyncio.start_server(server.handle_client, host, port)
+    print(f"Serving on {', '.join(str(s.getsockname()) for s in listener.sockets)}")
+    async with listener:
+        start = time.perf_counter()
+        while True:
+            await asyncio.sleep(report_seconds)
+            elapsed = time.perf_counter() - start
+            print(f"{server.matches_started - server.matches_finished} matches running, "
+                  f"{server.matches_finished} finished, {server.actions / elapsed:.0f} actions/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host online matches on the headless rules")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7777)
+    parser.add_argument("--seed", type=int, default=0, help="seeds the seed of every match")
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--record", help="append every match to this record file")
+    parser.add_argument("--reconnect-seconds", type=float, default=30,
+                        help="how long a disconnected player's seat is held")
+    args = parser.parse_args()
+
+    record_file = open(args.record, "ab") if args.record else None
+    try:
+        server = GameServer(args.seed, args.max_turns, record_file, args.reconnect_seconds)
+        asyncio.run(serve(args.host, args.port, server))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if record_file:
+            record_file.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# tournament.py
+
+import argparse
+import io
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from board import Board, build_layout
+from engine import seeded_game
+from ai import POLICIES
+from record import GameRecorder
+
+
+def new_stats(num_seats):
+    return {
+        "games": 0,
+        "draws": 0,
+        "turns": 0,
+        "wins": [0] * num_seats,
+        "captures": [0] * num_seats,
+        "warps": [0] * num_seats,
+    }
+
+
+def merge_stats(total, stats):
+    """Add the counters of stats into total"""
+    for key in ("games", "draws", "turns"):
+        total[key] += stats[key]
+    for key in ("wins", "captures", "warps"):
+        total[key] = [a + b for a, b in zip(total[key], stats[key])]
+    return total
+
+
+def play_seeded_games(seats, seeds, max_turns, board=None, record=False):
+    """Play one game per seed with the named policy in each seat.
+
+    With record, the games are also returned in the record format as stats["record"].
+    """
+    policies = [POLICIES[name] for name in seats]
+    board = board if board is not None else Board()
+    stats = new_stats(len(seats))
+    recorder = GameRecorder(io.BytesIO()) if record else None
+
+    for seed in seeds:
+        # Dice and warps get streams of their own; policies that play randomly use the global one
+        random.seed(seed)
+        state = seeded_game([True] * len(seats), seed, board)
+        if recorder:
+            recorder.start(state, seed)
+
+        while not state.game_over and state.turns_played < max_turns:
+            action = policies[state.current_player_index](state)
+            events = state.step(action)
+            if recorder:
+                recorder.record(action, events)
+            for event in events:
+                if event[0] == "capture":
+                    stats["captures"][event[1]] += 1
+                elif event[0] == "warp":
+                    stats["warps"][event[1]] += 1
+
+        stats["games"] += 1
+        stats["turns"] += state.turns_played
+        if state.winner is not None:
+            stats["wins"][state.winner.id] += 1
+        else:
+            stats["draws"] += 1
+        if recorder:
+            recorder.finish()
+
+    if recorder:
+        stats["record"] = recorder.out.getvalue()
+    return stats
+
+
+def _play_shard(args):
+    seats, seeds, max_turns, layout, record = args
+    return play_seeded_games(seats, seeds, max_turns, Board(layout=layout), record)
+
+
+def run_tournament(seats, seeds, workers=None, shard_size=1000, max_turns=1000, record_file=None,
+                   layout=None):
+    """Shard seeded games over a process pool and aggregate the results.
+
+    Counters are plain sums, so the result only depends on the seed set,
+    not on the number of workers or the order shards finish in. With a
+    record_file, every game is appended to it, in the order shards finish.
+    layout is a board.BoardLayout, the standard board by default.
+    """
+    seeds = list(seeds)
+    shards = [(seats, seeds[i:i + shard_size], max_turns, layout, record_file is not None)
+              for i in range(0, len(seeds), shard_size)]
+    total = new_stats(len(seats))
+
+    def add(stats):
+        record = stats.pop("record", None)
+        if record is not None:
+            record_file.write(record)
+        merge_stats(total, stats)
+
+    if workers == 1:
+        for shard in shards:
+            add(_play_shard(shard))
+        return total
+
+    with Pool(workers) as pool:
+        for stats in pool.imap_unordered(_play_shard, shards):
+            add(stats)
+    return total
+
+
+def print_report(seats, stats, elapsed):
+    games = stats["games"]
+    print(f"{games} games in {elapsed:.2f}s ({games / elapsed:.0f} games/s), "
+          f"{stats['draws']} hit the turn limit")
+    print(f"Average turns per game: {stats['turns'] / games:.2f}")
+    print(f"{'Seat':<6}{'Policy':<10}{'Win rate':>10}{'Captures':>12}{'Warps':>12}")
+    for seat, name in enumerate(seats):
+        print(f"{seat + 1:<6}{name:<10}"
+              f"{stats['wins'][seat] / games:>10.2%}"
+              f"{stats['captures'][seat] / games:>12.3f}"
+              f"{stats['warps'][seat] / games:>12.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run seeded AI-vs-AI games on all CPU cores")
+    parser.add_argument("--seats", nargs="+", default=["greedy", "greedy"],
+                        choices=sorted(POLICIES), help="policy for each seat, in turn order")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0, help="first seed, games use seed..seed+games-1")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--shard-size", type=int, default=1000)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--record", help="append every game to this record file")
+    parser.add_argument("--sides", type=int, default=5, help="board sides, one start tile each")
+    parser.add_argument("--side-length", type=int, default=8, help="tiles per side of the board")
+    parser.add_argument("--path-length", type=int, default=6, help="tiles in each straight path")
+    args = parser.parse_args()
+
+    if not 2 <= len(args.seats) <= 5:
+        parser.error("between 2 and 5 seats are supported")
+    if args.sides < len(args.seats) or args.side_length < 3 or args.path_length < 2:
+        parser.error("the board needs a side per seat, at least 3 tiles per side and 2 per path")
+    try:
+        layout = build_layout(args.sides, args.side_length, args.path_length)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.record and layout != build_layout():
+        # Records are replayed on the standard board
+        parser.error("--record only works on the standard board")
+
+    record_file = open(args.record, "ab") if args.record else None
+    start = time.perf_counter()
+    try:
+        stats = run_tournament(args.seats, range(args.seed, args.seed + args.games),
+                               args.workers, args.shard_size, args.max_turns, record_file, layout)
+    finally:
+        if record_file:
+            record_file.close()
+    print_report(args.seats, stats, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
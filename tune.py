@@ -0,0 +1,124 @@
+# tune.py
+
+import argparse
+import math
+import os
+import random
+import time
+from functools import partial
+from multiprocessing import Pool
+
+from board import Board
+from engine import seeded_game, play_game
+from ai import FEATURES, DEFAULT_WEIGHTS, greedy_policy
+
+# Typical size of a useful change to each weight, to scale the search steps
+STEP_SIZES = {"capture": 4, "warp": 4, "steps": 1,
+              "danger": 10, "escape": 10, "entry_distance": 10, "loop": 4, "ready": 4}
+
+
+def play_match(weights, seeds, max_turns=1000, board=None):
+    """Wins of the greedy AI with the given weights against the default greedy AI.
+
+    Two-player games, one per seed; the weighted AI takes the first seat on
+    even seeds and the second on odd ones, so every candidate faces the
+    same games from the same seats.
+    """
+    candidate = partial(greedy_policy, weights=dict(zip(FEATURES, weights)))
+    board = board if board is not None else Board()
+    wins = 0
+    for seed in seeds:
+        seat = seed % 2
+        policies = [greedy_policy, greedy_policy]
+        policies[seat] = candidate
+        random.seed(seed)
+        state = play_game(seeded_game([True, True], seed, board), policies, max_turns)
+        wins += state.winner is not None and state.winner.id == seat
+    return wins
+
+
+def _play_shard(args):
+    index, weights, seeds, max_turns = args
+    return index, play_match(weights, seeds, max_turns)
+
+
+def evaluate(pool, candidates, seeds, shard_size=100, max_turns=1000):
+    """Win rate of each weight vector over the same seeds, with games spread over the pool"""
+    seeds = list(seeds)
+    shards = [(index, weights, seeds[i:i + shard_size], max_turns)
+              for index, weights in enumerate(candidates)
+              for i in range(0, len(seeds), shard_size)]
+    wins = [0] * len(candidates)
+    for index, count in pool.imap_unordered(_play_shard, shards):
+        wins[index] += count
+    return [w / len(seeds) for w in wins]
+
+
+def wilson_interval(wins, games, z=1.96):
+    """Confidence interval (95% by default) of a win rate"""
+    if games == 0:
+        return 0.0, 1.0
+    p = wins / games
+    center = (p + z * z / (2 * games)) / (1 + z * z / games)
+    half = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return center - half, center + half
+
+
+def hill_climb(pool, start, iterations, games, candidates, sigma, seed=0, max_turns=1000, log=print):
+    """Stochastic hill climbing over weight vectors.
+
+    Each iteration plays the current best and a few Gaussian mutations of it
+    on a fresh set of seeds shared by all of them; the best one is kept.
+    The step size shrinks when no mutation wins and grows when one does.
+    """
+    rng = random.Random(seed)
+    scales = [STEP_SIZES[name] for name in FEATURES]
+    best = list(start)
+    next_seed = seed
+    for iteration in range(iterations):
+        population = [best] + [[w + rng.gauss(0, sigma * s) for w, s in zip(best, scales)]
+                               for _ in range(candidates)]
+        seeds = range(next_seed, next_seed + games)
+        next_seed += games
+        rates = evaluate(pool, population, seeds, max_turns=max_turns)
+
+        winner = max(range(len(population)), key=rates.__getitem__)
+        if winner:
+            best = population[winner]
+            sigma *= 1.2
+        else:
+            sigma *= 0.7
+        log(f"Iteration {iteration + 1}: best {rates[winner]:.1%} vs incumbent {rates[0]:.1%}, step {sigma:.3f}")
+    return best, next_seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the greedy AI's move weights by self-play")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--games", type=int, default=400, help="games per candidate per iteration")
+    parser.add_argument("--candidates", type=int, default=6, help="mutations tried per iteration")
+    parser.add_argument("--sigma", type=float, default=0.5, help="initial step, relative to STEP_SIZES")
+    parser.add_argument("--validate-games", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--max-turns", type=int, default=1000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with Pool(args.workers) as pool:
+        best, next_seed = hill_climb(pool, [DEFAULT_WEIGHTS[name] for name in FEATURES],
+                                     args.iterations, args.games, args.candidates, args.sigma,
+                                     args.seed, args.max_turns)
+        # Fresh seeds, so the estimate isn't biased by the selection
+        seeds = range(next_seed, next_seed + args.validate_games)
+        rate = evaluate(pool, [best], seeds, max_turns=args.max_turns)[0]
+
+    low, high = wilson_interval(round(rate * args.validate_games), args.validate_games)
+    print(f"Tuned in {time.perf_counter() - start:.1f}s")
+    print("Weights: " + ", ".join(f"{name}={weight:.3g}" for name, weight in zip(FEATURES, best)))
+    print(f"Win rate against the default weights over {args.validate_games} new games: "
+          f"{rate:.1%} (95% CI {low:.1%} to {high:.1%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# zobrist.py
+
+import random
+from collections import OrderedDict
+from functools import lru_cache
+
+from config import MAX_PLAYERS, DICE_PER_TURN
+
+HASH_MASK = (1 << 64) - 1
+MAX_SCORE = 16  # Scores past this share a key, games end at WINNING_SCORE anyway
+
+
+class ZobristKeys:
+    """Random 64-bit keys for every part of the game state.
+
+    Keys are added (mod 2**64) rather than XORed, so tokens of one player
+    on the same tile don't cancel out and interchangeable tokens hash the
+    same whichever token_id they have.
+    """
+
+    def __init__(self, num_tiles, seed=0x1D0):
+        rng = random.Random(seed)
+        self.home_slot = num_tiles
+        # token[player][slot][flags]: slot is the tile or home_slot,
+        # flags is ready_for_straight | ready_for_final << 1
+        self.token = [[[rng.getrandbits(64) for _ in range(4)]
+                       for _ in range(num_tiles + 1)]
+                      for _ in range(MAX_PLAYERS)]
+        self.score = [[rng.getrandbits(64) for _ in range(MAX_SCORE)] for _ in range(MAX_PLAYERS)]
+        self.warp = [rng.getrandbits(64) for _ in range(num_tiles)]
+        self.to_move = [rng.getrandbits(64) for _ in range(MAX_PLAYERS)]
+        self.remaining = [rng.getrandbits(64) for _ in range(DICE_PER_TURN * 6 + 1)]
+        self.rolled = rng.getrandbits(64)
+        self.six_available = rng.getrandbits(64)
+        self.capture_this_roll = rng.getrandbits(64)
+
+    def token_key(self, token):
+        slot = self.home_slot if token.in_home else token.position
+        flags = token.ready_for_straight | token.ready_for_final << 1
+        return self.token[token.player_id][slot][flags]
+
+    def score_key(self, player_id, score):
+        return self.score[player_id][min(score, MAX_SCORE - 1)]
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(num_tiles):
+    """Shared keys for a board size; seeded, so every process builds the same keys"""
+    return ZobristKeys(num_tiles)
+
+
+class TranspositionTable:
+    """Bounded cache of search results keyed by position hash.
+
+    An entry is only replaced by a result searched at least as deep, and
+    when the table is full the least recently used entry is dropped.
+    """
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, depth):
+        """Stored value for key if it was searched at least depth deep, else None"""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < depth:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def store(self, key, depth, value):
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > depth:
+                return
+            self.entries.move_to_end(key)
+        elif len(self.entries) >= self.max_entries:
+            self.entries.popitem(last=False)
+        self.entries[key] = (depth, value)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0